@@ -0,0 +1,247 @@
+import json
+import time
+import threading
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# A local stand-in for the parts of TikTok the bot touches:
+#   /@<name>            profile page with rehydration JSON carrying the userId
+#   /messages           inbox with one conversation per friend
+#   /messages?u=<uid>   chat with a virtual-scrolling history and a message input
+#   /passport/web/account/info/   logged-in account info used by the session check
+# Markup mirrors the class names and data-e2e attributes main.py looks for.
+
+PROFILE_PAGE = """<!DOCTYPE html>
+<html><head><title>{name} (@{name}) | TikTok</title></head>
+<body>
+<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">{data}</script>
+<main data-e2e="user-page">
+  <h1 data-e2e="user-title">{name}</h1>
+  <button data-e2e="message-button">Message</button>
+</main>
+</body></html>"""
+
+INBOX_PAGE = """<!DOCTYPE html>
+<html><head><title>Messages | TikTok</title>
+<style>
+  .css-list-DivConversationListContainer {{ height: 600px; overflow-y: auto; width: 360px; }}
+  .css-item-DivItemWrapper {{ height: 72px; border-bottom: 1px solid #eee; }}
+</style></head>
+<body>
+<div class="css-list-DivConversationListContainer">{items}</div>
+</body></html>"""
+
+INBOX_ITEM = """<div data-e2e="chat-list-item" class="css-item-DivItemWrapper">
+  <a href="/@{name}"><p class="css-p-PInfoNickname">{name}</p></a>
+  <span class="css-s-SpanInfoExtract">{preview}</span>
+  <span class="css-t-SpanInfoTime">{time}</span>
+</div>"""
+
+# Only the rows near the viewport exist in the DOM, like TikTok's real chat.
+# Rows are keyed by index and reused, so the DOM order is always chronological.
+CHAT_PAGE = """<!DOCTYPE html>
+<html><head><title>Messages | TikTok</title>
+<style>
+  body { margin: 0; font-family: sans-serif; }
+  .css-c-DivChatMainContent { position: relative; height: 600px; width: 1000px; overflow-y: auto; }
+  .css-r-DivChatItemWrapper, .css-t-DivTimeContainer { position: absolute; left: 0; right: 0; height: 40px; }
+  .css-t-DivTimeContainer { text-align: center; color: #888; }
+  .css-h-DivMessageHorizontalContainer { display: flex; flex-direction: row; }
+  .out .css-h-DivMessageHorizontalContainer { flex-direction: row-reverse; }
+  [data-e2e="message-input-area"] { width: 1000px; border: 1px solid #ccc; }
+  [contenteditable="true"] { min-height: 24px; }
+</style></head>
+<body>
+<div class="css-c-DivChatMainContent" id="chat"><div id="spacer"></div></div>
+<div data-e2e="message-input-area"><div contenteditable="true" role="textbox"></div></div>
+<script>
+  const ROW = 40, OVERSCAN = 10;
+  const rows = __ROWS__;
+  const uid = "__UID__";
+  const chat = document.getElementById('chat');
+  const spacer = document.getElementById('spacer');
+  const nodes = new Map();
+
+  const makeRow = (row, index) => {
+    const el = document.createElement('div');
+    if (row.kind === 'time') {
+      el.className = 'css-t-DivTimeContainer';
+      el.innerText = row.text;
+    } else {
+      el.className = 'css-r-DivChatItemWrapper' + (row.outgoing ? ' out' : '');
+      el.innerHTML = '<div class="css-h-DivMessageHorizontalContainer"><div data-e2e="chat-avatar"></div>' +
+        '<p data-e2e="dm-new-message-text"></p></div>';
+      el.querySelector('p').innerText = row.text;
+    }
+    el.style.top = (index * ROW) + 'px';
+    return el;
+  };
+
+  const render = () => {
+    spacer.style.height = (rows.length * ROW) + 'px';
+    const first = Math.max(0, Math.floor(chat.scrollTop / ROW) - OVERSCAN);
+    const last = Math.min(rows.length, Math.ceil((chat.scrollTop + chat.clientHeight) / ROW) + OVERSCAN);
+    const wanted = [spacer];
+    for (let i = first; i < last; i++) {
+      if (!nodes.has(i)) nodes.set(i, makeRow(rows[i], i));
+      wanted.push(nodes.get(i));
+    }
+    for (const i of Array.from(nodes.keys())) {
+      if (i < first || i >= last) nodes.delete(i);
+    }
+    const current = Array.from(chat.children);
+    if (current.length !== wanted.length || current.some((el, i) => el !== wanted[i])) {
+      chat.replaceChildren(...wanted);
+    }
+  };
+
+  chat.addEventListener('scroll', render);
+  // The input box is usable straight away, the history shows up after __RENDER_DELAY__ms
+  setTimeout(() => {
+    chat.scrollTop = rows.length * ROW;
+    render();
+  }, __RENDER_DELAY__);
+
+  const input = document.querySelector('[contenteditable="true"]');
+  input.addEventListener('keydown', (event) => {
+    if (event.key !== 'Enter') return;
+    event.preventDefault();
+    const text = input.innerText.trim();
+    if (!text) return;
+    input.innerText = '';
+    rows.push({ kind: 'message', text, outgoing: true });
+    fetch('/api/send?u=' + uid, { method: 'POST', body: text });
+    chat.scrollTop = rows.length * ROW;
+    render();
+  });
+</script>
+</body></html>"""
+
+
+def build_chat_rows(chat_length, sent_today):
+    """Synthetic history: older days first, then today's section with the newest rows last."""
+    rows = []
+    today_messages = max(1, chat_length // 3)
+    older_messages = chat_length - today_messages
+    day = date.today() - timedelta(days=older_messages // 10 + 1)
+    for i in range(older_messages):
+        if i % 10 == 0:
+            rows.append({"kind": "time", "text": day.strftime("%b %d, %Y 10:00")})
+            day += timedelta(days=1)
+        rows.append({"kind": "message", "text": f"old message {i}", "outgoing": i % 2 == 0})
+
+    # Our streak message sits at the start of today's section so the scanner has to scroll for it
+    for i in range(today_messages):
+        if i % 10 == 0:
+            rows.append({"kind": "time", "text": f"{8 + i // 10 % 12:02d}:{i % 60:02d}"})
+        outgoing = sent_today and i == 0
+        rows.append({"kind": "message", "text": "streak" if outgoing else f"incoming {i}", "outgoing": outgoing})
+    return rows
+
+
+class FixtureState:
+    def __init__(self, friends, chat_length, latency, sent_ratio, render_delay=0.0):
+        self.latency = latency
+        self.render_delay = render_delay
+        self.friends = {}
+        sent_count = int(len(friends) * sent_ratio)
+        for i, name in enumerate(friends):
+            self.friends[name] = {
+                "uid": str(7000000000000000000 + i),
+                "sent_today": i < sent_count,
+                "rows": None,
+                "chat_length": chat_length
+            }
+        self.by_uid = {info["uid"]: name for name, info in self.friends.items()}
+        self.received = []
+        self.lock = threading.Lock()
+
+    def rows_for(self, name):
+        info = self.friends[name]
+        if info["rows"] is None:
+            info["rows"] = build_chat_rows(info["chat_length"], info["sent_today"])
+        return info["rows"]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_html(self, body, status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        time.sleep(self.state.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith("/@"):
+            name = url.path[2:].lower()
+            info = self.state.friends.get(name)
+            if not info:
+                self.send_html("<html><head><title>Couldn't find this account | TikTok</title></head></html>", 404)
+                return
+            data = {"__DEFAULT_SCOPE__": {"webapp.user-detail": {"userInfo": {
+                "user": {"id": info["uid"], "uniqueId": name, "nickname": name}
+            }}}}
+            self.send_html(PROFILE_PAGE.format(name=name, data=json.dumps(data)))
+        elif url.path == "/passport/web/account/info/":
+            self.send_json({"message": "success", "data": {"user_id": "6900000000000000000", "username": "bench"}})
+        elif url.path == "/messages" and "u" in query:
+            name = self.state.by_uid.get(query["u"][0])
+            rows = self.state.rows_for(name) if name else []
+            page = (
+                CHAT_PAGE.replace("__ROWS__", json.dumps(rows)).replace("__UID__", query["u"][0])
+                .replace("__RENDER_DELAY__", str(int(self.state.render_delay * 1000)))
+            )
+            self.send_html(page)
+        elif url.path == "/messages":
+            items = []
+            for name, info in self.state.friends.items():
+                rows = self.state.rows_for(name)
+                last = rows[-1]
+                last_time = next(row["text"] for row in reversed(rows) if row["kind"] == "time")
+                preview = ("You: " if last["outgoing"] else "") + last["text"]
+                items.append(INBOX_ITEM.format(name=name, preview=preview, time=last_time))
+            self.send_html(INBOX_PAGE.format(items="".join(items)))
+        else:
+            self.send_html("<html><head><title>Not found</title></head></html>", 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if url.path == "/api/send":
+            uid = parse_qs(url.query).get("u", [""])[0]
+            with self.state.lock:
+                self.state.received.append((self.state.by_uid.get(uid), body))
+        self.send_response(204)
+        self.end_headers()
+
+
+def start_fixture_server(friends, chat_length=60, latency=0.0, sent_ratio=0.0, port=0, render_delay=0.0):
+    """Start the stand-in server on a background thread and return (server, state, base_url).
+
+    render_delay holds back the chat history (not the input box) by that many seconds.
+    """
+    state = FixtureState(friends, chat_length, latency, sent_ratio, render_delay)
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+
+# Runs the real main.run_automation() against the local fixture server, fully offline.
+# Every run happens in a fresh temporary directory so logs, caches, the ledger and
+# screenshots never touch the repository or a previous run.
+#
+#   python benchmark/run_benchmark.py --friends 20 --chat-length 300 --latency 0.05
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import start_fixture_server
+
+
+def peak_rss_mb():
+    # Linux reports ru_maxrss in KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def descendants(root):
+    """Every process below root, found through the parent PID in /proc/<pid>/stat."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name can contain spaces, so split after its closing parenthesis
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    found, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        found.extend(children)
+        todo.extend(children)
+    return found
+
+
+def process_memory_kb(pid):
+    # Pss splits the pages Chromium's processes share between them, so the sum isn't inflated.
+    # Plain VmRSS is the fallback on kernels without smaps_rollup.
+    for path, key in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            continue
+    return 0
+
+
+class BrowserMemorySampler(threading.Thread):
+    """Samples the summed memory of this process's descendants (the browser tree) while it runs."""
+
+    def __init__(self, interval=0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_kb = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def sample(self):
+        if not os.path.isdir("/proc"):
+            return
+        total = sum(process_memory_kb(pid) for pid in descendants(os.getpid()))
+        self.peak_kb = max(self.peak_kb, total)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak_kb / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main.py against a local stand-in TikTok server")
+    parser.add_argument("--friends", type=int, default=10, help="number of synthetic friends")
+    parser.add_argument("--chat-length", type=int, default=60, help="messages in each chat history")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every page response")
+    parser.add_argument("--sent-ratio", type=float, default=0.0, help="share of friends already messaged today")
+    parser.add_argument("--render-delay", type=float, default=0.0, help="seconds before a chat's history renders")
+    parser.add_argument("--concurrency", type=int, default=1, help="CONCURRENCY passed to the bot")
+    parser.add_argument("--no-filter", action="store_true", help="turn the resource filter off to compare against it")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    friends = [f"friend{i:03d}" for i in range(args.friends)]
+    server, state, base_url = start_fixture_server(
+        friends, args.chat_length, args.latency, args.sent_ratio, render_delay=args.render_delay
+    )
+
+    workdir = tempfile.mkdtemp(prefix="streak_bench_")
+    os.chdir(workdir)
+    os.environ.update({
+        "TIKTOK_BASE_URL": base_url,
+        "FRIENDS_LIST": ",".join(friends),
+        "TIKTOK_COOKIES": "[]",
+        "CONCURRENCY": str(args.concurrency),
+        "FRIEND_DELAY": "0,0",
+        "JITTER_BUDGET": "0",
+    })
+    if args.no_filter:
+        os.environ.update({"BLOCK_RESOURCE_TYPES": "", "BLOCK_URL_PATTERNS": ""})
+
+    # Imported late so the bot picks up the environment above and logs into workdir
+    import main as bot
+
+    sampler = BrowserMemorySampler()
+    sampler.start()
+    started = time.monotonic()
+    try:
+        report = asyncio.run(bot.run_automation()) or {}
+    finally:
+        browser_mb = sampler.stop()
+    total = time.monotonic() - started
+    server.shutdown()
+
+    latencies = list(report.get("friend_seconds", {}).values())
+    results = {
+        "friends": args.friends,
+        "chat_length": args.chat_length,
+        "latency": args.latency,
+        "sent_ratio": args.sent_ratio,
+        "render_delay": args.render_delay,
+        "concurrency": args.concurrency,
+        "total_seconds": round(total, 2),
+        "friend_p50_seconds": round(bot.percentile(latencies, 50), 2),
+        "friend_p95_seconds": round(bot.percentile(latencies, 95), 2),
+        "friend_mean_seconds": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "successful": report.get("success", 0),
+        "failed": len(report.get("failed", [])),
+        "resource_filter": not args.no_filter,
+        "blocked_requests": report.get("blocked_requests", 0),
+        "blocked_mb": round(report.get("blocked_bytes", 0) / 1024 / 1024, 2),
+        "downloaded_mb": round(report.get("downloaded_bytes", 0) / 1024 / 1024, 2),
+        "messages_received": len(state.received),
+        # Messages sent to friends whose chat already had today's message; should always be 0
+        "duplicate_messages": sum(1 for name, _ in state.received if name and state.friends[name]["sent_today"]),
+        # The Python side (bot and fixture server), then the whole browser process tree
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_browser_mb": round(browser_mb, 1),
+        "workdir": workdir,
+    }
+
+    print("--- Benchmark Results ---")
+    for key, value in results.items():
+        print(f"{key}: {value}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
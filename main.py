@@ -1,9 +1,15 @@
 import os
+import re
 import json
 import time
 import random
+import asyncio
+import hashlib
 import logging
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+import argparse
+from collections import deque
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
 
 # Configure Logging
@@ -20,24 +26,1488 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def run_automation():
+# Where TikTok lives. Only changed to point the bot at a local stand-in server (see benchmark/).
+BASE_URL = os.getenv("TIKTOK_BASE_URL", "https://www.tiktok.com").rstrip("/")
+
+# Browser cookies and local storage saved at the end of each run and reused by the next,
+# so the session TikTok refreshed during the run carries over
+STORAGE_STATE_PATH = os.getenv("STORAGE_STATE_PATH", "storage_state.json")
+# Cheap authenticated endpoint used to check the session before any friend work
+SESSION_CHECK_PATH = "/passport/web/account/info/?aid=1459"
+# Exit code when the session is dead, so CI shows a clear "log in again" failure
+EXIT_SESSION_DEAD = 3
+
+# Several accounts in one run: a JSON list in ACCOUNTS, or in ACCOUNTS_FILE. Each entry has a
+# "name", "cookies" (or "cookies_env", the name of an env var holding them), "friends" and
+# an optional "message". Without either, the single TIKTOK_COOKIES/FRIENDS_LIST account runs.
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "accounts.json")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+
+# How many friends are processed at the same time. Each worker gets its own page
+# inside the shared browser context, so cookies are only loaded once.
+CONCURRENCY = max(1, int(os.getenv("CONCURRENCY", "1")))
+
+def env_list(name, default=""):
+    # Comma-separated environment variable as a list, empty entries dropped
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+# Requests the bot never needs. Resource types are playwright's request.resource_type values,
+# URL patterns are plain substrings. ALLOW_URL_PATTERNS always wins over both deny lists.
+# Stylesheets stay allowed: the history check relies on computed styles.
+# Only analytics and ad hosts are blocked by default. TikTok's security SDK (mssdk) signs
+# API calls, and blocking it invites the verification pages the circuit breaker backs off from.
+BLOCK_RESOURCE_TYPES = set(env_list("BLOCK_RESOURCE_TYPES", "image,media,font"))
+# DevTools spells a few resource types differently from playwright; the rest are capitalized
+CDP_RESOURCE_TYPES = {"xhr": "XHR", "websocket": "WebSocket", "texttrack": "TextTrack", "eventsource": "EventSource"}
+BLOCK_URL_PATTERNS = env_list(
+    "BLOCK_URL_PATTERNS",
+    "mon.tiktokv.com,mcs.tiktokw.com,google-analytics.com,googletagmanager.com,doubleclick.net"
+)
+ALLOW_URL_PATTERNS = env_list("ALLOW_URL_PATTERNS")
+
+# Randomized pause between two friends on the same worker, "min,max" in seconds
+FRIEND_DELAY = [float(x) for x in env_list("FRIEND_DELAY", "15,30")]
+
+# A friend that fails is put back at the end of the queue until it has had this many tries
+MAX_FRIEND_ATTEMPTS = int(os.getenv("MAX_FRIEND_ATTEMPTS", "3"))
+# Captcha/verify pages and HTTP 429 open a run-wide circuit breaker: every worker pauses for
+# an exponential backoff with jitter, and the run gives up after too many blocks in a row
+BACKOFF_BASE = float(os.getenv("BACKOFF_BASE", "30"))
+BACKOFF_MAX = float(os.getenv("BACKOFF_MAX", "600"))
+MAX_CONSECUTIVE_BLOCKS = int(os.getenv("MAX_CONSECUTIVE_BLOCKS", "4"))
+
+# Usernames never change their user ID, so we remember them between runs
+UID_CACHE_PATH = os.getenv("UID_CACHE_PATH", "uid_cache.json")
+
+# Seconds of random "human" pausing allowed per friend, on top of the readiness waits.
+# The pauses are drawn from this budget so they can never add up past it.
+JITTER_BUDGET = float(os.getenv("JITTER_BUDGET", "3"))
+
+# Which selector won for each role in past runs; used to break ties when racing them
+SELECTOR_STATS_PATH = os.getenv("SELECTOR_STATS_PATH", "selector_stats.json")
+
+MESSAGE_BUTTON_SELECTORS = [
+    '[data-e2e="message-button"]',
+    'button:has-text("Message")',
+    'div[role="button"]:has-text("Message")',
+    'main a[href*="/messages"]'
+]
+
+CHAT_INPUT_SELECTORS = [
+    '[data-e2e="message-input-area"] [contenteditable="true"]',
+    '[contenteditable="true"]',
+    '.public-DraftEditor-content',
+    '[role="textbox"]'
+]
+
+# Split the friend list across several runners. Each shard handles the friends whose
+# normalized username hashes to its index and writes its totals to its own result file.
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+RESULT_DIR = os.getenv("RESULT_DIR", ".")
+
+# Per-friend, per-phase timing spans as JSON lines, next to streak_bot.log
+TIMINGS_PATH = os.getenv("TIMINGS_PATH", "streak_bot_timings.jsonl")
+
+# Append-only journal of per-friend outcomes. Friends with a "sent" or "already_sent"
+# entry for today are skipped without opening a browser page, so a rerun resumes.
+LEDGER_PATH = os.getenv("LEDGER_PATH", "sent_ledger.jsonl")
+LEDGER_DONE_OUTCOMES = ("sent", "already_sent")
+
+# Read the messages inbox once before the per-friend work and skip anybody whose
+# conversation already ends with our own message from today
+INBOX_PLANNING = os.getenv("INBOX_PLANNING", "1") != "0"
+
+STREAK_MESSAGE = os.getenv("STREAK_MESSAGE", "โฟปริ้นลืมเติมไฟอีกแล้วจ้า ระบบสำรองไฟทำงาน😎")
+
+# How the message gets into the chat box: "insert" (one input event), "paste" (a synthetic
+# clipboard paste) or "type" (real keystrokes). The others are tried if the first one fails.
+SEND_STRATEGY = os.getenv("SEND_STRATEGY", "insert")
+# Seconds a strategy may take: "type" spreads its keystrokes over it, the others get it
+# as the time limit for the text to show up in the box
+SEND_BUDGET = float(os.getenv("SEND_BUDGET", "2"))
+# Seconds to wait for our new message bubble to appear after pressing Enter
+SEND_CONFIRM_TIMEOUT = float(os.getenv("SEND_CONFIRM_TIMEOUT", "5"))
+
+# Which screenshots are written to disk: "failures" (only for friends that end up failed,
+# blocked, not found or logged out), "sampled" (failures plus a random share of the rest)
+# or "always". Screenshots are JPEGs of the visible page, taken in the background.
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "failures")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.1"))
+CAPTURE_QUALITY = int(os.getenv("CAPTURE_QUALITY", "60"))
+# Only the newest captures of a friend are kept in memory, up to this many KB,
+# and a run writes at most CAPTURE_RUN_MB to disk
+CAPTURE_FRIEND_KB = int(os.getenv("CAPTURE_FRIEND_KB", "1024"))
+CAPTURE_RUN_MB = float(os.getenv("CAPTURE_RUN_MB", "20"))
+CAPTURE_FAILED_OUTCOMES = ("failed", "blocked", "not_found", "logged_out")
+
+# Reads the profile owner's ID straight out of TikTok's rehydration JSON instead of
+# copying the whole page into Python. Returns null if the data doesn't match the user.
+JS_EXTRACT_USER_ID = """(uniqueId) => {
+    const matches = (user) => user && user.id && (!uniqueId || (user.uniqueId || '').toLowerCase() === uniqueId);
+
+    const universal = document.getElementById('__UNIVERSAL_DATA_FOR_REHYDRATION__');
+    if (universal) {
+        try {
+            const scope = JSON.parse(universal.textContent).__DEFAULT_SCOPE__ || {};
+            const detail = scope['webapp.user-detail'] || {};
+            const user = (detail.userInfo || {}).user;
+            if (matches(user)) return String(user.id);
+        } catch (e) {}
+    }
+
+    // Older layout keeps every user on the page in UserModule, keyed by uniqueId
+    const sigi = document.getElementById('SIGI_STATE');
+    if (sigi) {
+        try {
+            const users = (JSON.parse(sigi.textContent).UserModule || {}).users || {};
+            for (const user of Object.values(users)) {
+                if (matches(user)) return String(user.id);
+            }
+        } catch (e) {}
+    }
+    return null;
+}"""
+
+# Scans the chat history in a single round-trip. It drives its own scrolling and keeps
+# its state between scroll steps: a MutationObserver flags newly rendered nodes and every
+# node's classification (timestamp text, outgoing or not) is computed only once.
+# It first waits up to loadTimeoutMs for a chat item or an empty-chat marker, because the
+# history can render well after the input box does.
+# Resolves to {result, steps, stepMs, loadMs} where result starts with "SKIP" or "SEND".
+JS_HISTORY_SCANNER = """async ({ todayStr, maxSteps, stepPx, settleMs, loadTimeoutMs }) => {
+    const SELECTOR = '[class*="DivTimeContainer"], [class*="DivChatItemWrapper"]';
+    const EMPTY = '[data-e2e="dm-empty"], [class*="DivEmptyContainer"], [class*="DivChatEmpty"]';
+    const seen = new WeakMap();
+
+    const isOutgoingMessage = (el) => {
+        const horizontalContainers = el.querySelectorAll('[class*="DivMessageHorizontalContainer"]');
+        for (const hc of horizontalContainers) {
+            const hcStyle = window.getComputedStyle(hc);
+            if (hcStyle.flexDirection === 'row-reverse' || hcStyle.justifyContent === 'flex-end') return true;
+        }
+        for (const avatar of el.querySelectorAll('[data-e2e="chat-avatar"]')) {
+            if (avatar.getBoundingClientRect().left > window.innerWidth / 2) return true;
+        }
+        const textBubble = el.querySelector('[data-e2e="dm-new-message-text"]');
+        if (textBubble && textBubble.getBoundingClientRect().left > window.innerWidth / 2) return true;
+        const style = window.getComputedStyle(el);
+        return style.justifyContent === 'flex-end' || style.textAlign === 'right' || style.float === 'right';
+    };
+
+    const classify = (el) => {
+        let info = seen.get(el);
+        if (info) return info;
+        const className = String(el.className || '');
+        if (className.includes('DivTimeContainer')) {
+            const timeText = (el.innerText || '').trim();
+            const mentionsToday = timeText.toLowerCase().includes('today') || timeText.includes(todayStr);
+            info = {
+                timestamp: true,
+                isToday: /^\\d{1,2}[:.]\\d{2}(?:\\s?[AaPp][Mm])?$/.test(timeText) || mentionsToday,
+                isOld: !/^\\d{1,2}[:.]\\d{2}/.test(timeText) && !mentionsToday,
+            };
+        } else {
+            // Outgoing is only worked out (once) if the message turns out to sit under a today timestamp
+            info = { timestamp: false, isOutgoing: undefined };
+        }
+        seen.set(el, info);
+        return info;
+    };
+
+    let everFoundTodayTimestamp = false;
+    const check = () => {
+        const allElements = document.querySelectorAll(SELECTOR);
+        if (allElements.length === 0) return "CONTINUE: No elements found yet.";
+
+        let currentSectionIsToday = false;
+        let oldest = null;
+        for (const el of allElements) {
+            const info = classify(el);
+            if (info.timestamp) {
+                if (!oldest) oldest = info;
+                currentSectionIsToday = info.isToday;
+                if (info.isToday) everFoundTodayTimestamp = true;
+            } else if (currentSectionIsToday) {
+                if (info.isOutgoing === undefined) info.isOutgoing = isOutgoingMessage(el);
+                if (info.isOutgoing) return "SKIP: Found outgoing message under a today timestamp.";
+            }
+        }
+        // The oldest rendered timestamp is not from today, so we've scrolled past all of today's messages
+        if (oldest && oldest.isOld && everFoundTodayTimestamp) {
+            return "SEND: Scrolled through all today's messages, no outgoing found.";
+        }
+        if (everFoundTodayTimestamp) return "CONTINUE: Today's messages visible but no outgoing yet, scroll more.";
+        return "SEND: No today timestamps found.";
+    };
+
+    const findScroller = () => {
+        const item = document.querySelector(SELECTOR);
+        for (let el = item && item.parentElement; el && el !== document.body; el = el.parentElement) {
+            const overflowY = window.getComputedStyle(el).overflowY;
+            if ((overflowY === 'auto' || overflowY === 'scroll') && el.scrollHeight > el.clientHeight) return el;
+        }
+        return null;
+    };
+
+    let dirty = false;
+    let notify = () => {};
+    const observer = new MutationObserver((records) => {
+        if (records.some((r) => r.addedNodes.length > 0)) {
+            dirty = true;
+            notify();
+        }
+    });
+    // Resolves 50ms after the last batch of new nodes, or after ms if nothing renders
+    const waitForRender = (ms) => new Promise((resolve) => {
+        let settle = null;
+        const done = () => { clearTimeout(settle); clearTimeout(limit); notify = () => {}; resolve(); };
+        const limit = setTimeout(done, ms);
+        notify = () => { clearTimeout(settle); settle = setTimeout(done, 50); };
+    });
+
+    // True once a chat item or the empty-chat marker is on the page, false on timeout
+    const waitForHistory = async (ms) => {
+        const deadline = performance.now() + ms;
+        while (!document.querySelector(SELECTOR) && !document.querySelector(EMPTY)) {
+            const left = deadline - performance.now();
+            if (left <= 0) return false;
+            await waitForRender(left);
+        }
+        return true;
+    };
+
+    observer.observe(document.body, { childList: true, subtree: true });
+    try {
+        let steps = 0;
+        let scroller = null;
+        const stepMs = [];
+        const loadStart = performance.now();
+        const loaded = await waitForHistory(loadTimeoutMs);
+        const loadMs = performance.now() - loadStart;
+        if (!loaded) {
+            return { result: "SEND: No chat history rendered before the timeout.", steps, stepMs, loadMs };
+        }
+        if (!document.querySelector(SELECTOR)) {
+            return { result: "SEND: Chat is empty.", steps, stepMs, loadMs };
+        }
+        dirty = false;
+        let result = check();
+        while (result.startsWith('CONTINUE') && steps < maxSteps) {
+            const stepStart = performance.now();
+            scroller = scroller || findScroller();
+            const atTop = scroller ? scroller.scrollTop <= 0 : window.scrollY <= 0;
+            if (scroller) scroller.scrollTop -= stepPx;
+            else window.scrollBy(0, -stepPx);
+            steps += 1;
+
+            await waitForRender(settleMs);
+            const rendered = dirty;
+            if (rendered) {
+                dirty = false;
+                result = check();
+            }
+            stepMs.push(performance.now() - stepStart);
+            if (!rendered && atTop) break;
+        }
+        if (result.startsWith('CONTINUE')) {
+            result = "SEND: Reached the top of the loaded history, no outgoing found.";
+        }
+        return { result, steps, stepMs, loadMs };
+    } finally {
+        observer.disconnect();
+    }
+}"""
+
+
+# Reads the conversation list on the messages inbox. Scrolls the list until the newest
+# conversations stop being from today (older ones can't contain today's message anyway).
+# Resolves to [{name, uniqueId, time, preview, isToday, outgoing}] in list order.
+JS_INBOX_READER = """async ({ todayStr, maxSteps, settleMs }) => {
+    const ITEMS = '[data-e2e="chat-list-item"], [class*="DivItemWrapper"]';
+    const textOf = (item, part) => {
+        const el = item.querySelector(`[class*="${part}"]`);
+        return el ? (el.innerText || '').trim() : '';
+    };
+    // Anchored like the history scanner: "12.10.2026" is a date, not a time from today.
+    // A false "today" here skips the friend for the whole day, so err on "not today".
+    const isTodayTime = (text) => /^\\d{1,2}[:.]\\d{2}(?:\\s?[AaPp][Mm])?$/.test(text) || text.toLowerCase().includes('today') || text.includes(todayStr);
+
+    const conversations = new Map();
+    const read = () => {
+        for (const item of document.querySelectorAll(ITEMS)) {
+            const link = item.querySelector('a[href*="/@"]');
+            const uniqueId = link ? (link.getAttribute('href').match(/\\/@([^/?#]+)/) || [])[1] || '' : '';
+            const name = textOf(item, 'Nickname') || textOf(item, 'Name');
+            const key = uniqueId || name;
+            if (!key || conversations.has(key)) continue;
+            const time = textOf(item, 'Time');
+            const preview = textOf(item, 'Extract') || textOf(item, 'LastMsg');
+            conversations.set(key, {
+                name, uniqueId, time, preview,
+                isToday: isTodayTime(time),
+                // TikTok prefixes the preview with "You:" when the last message is ours
+                outgoing: /^(you|คุณ)\\s*:/i.test(preview),
+            });
+        }
+    };
+
+    read();
+    const first = document.querySelector(ITEMS);
+    let list = null;
+    for (let el = first && first.parentElement; el && el !== document.body; el = el.parentElement) {
+        const overflowY = window.getComputedStyle(el).overflowY;
+        if ((overflowY === 'auto' || overflowY === 'scroll') && el.scrollHeight > el.clientHeight) { list = el; break; }
+    }
+    for (let step = 0; list && step < maxSteps; step++) {
+        const all = Array.from(conversations.values());
+        if (all.length && !all[all.length - 1].isToday) break;
+        const before = conversations.size;
+        list.scrollTop += list.clientHeight;
+        await new Promise((resolve) => setTimeout(resolve, settleMs));
+        read();
+        if (conversations.size === before) break;
+    }
+    return Array.from(conversations.values());
+}"""
+
+
+JS_PASTE_TEXT = """([el, text]) => {
+    const target = el || document.activeElement;
+    const data = new DataTransfer();
+    data.setData('text/plain', text);
+    target.dispatchEvent(new ClipboardEvent('paste', { clipboardData: data, bubbles: true, cancelable: true }));
+}"""
+
+# Remember the newest bubble before sending, then wait for a different newest bubble with our text
+# (any new bubble when the probe is empty)
+JS_MARK_LAST_BUBBLE = """() => {
+    const bubbles = document.querySelectorAll('[data-e2e="dm-new-message-text"]');
+    window.__streakLastBubble = bubbles[bubbles.length - 1] || null;
+}"""
+JS_NEW_BUBBLE_WITH = """(probe) => {
+    const bubbles = document.querySelectorAll('[data-e2e="dm-new-message-text"]');
+    const last = bubbles[bubbles.length - 1];
+    return !!last && last !== window.__streakLastBubble && (last.innerText || '').includes(probe);
+}"""
+
+
+class StaleUidError(Exception):
+    pass
+
+
+class SendNotConfirmedError(Exception):
+    pass
+
+
+class SessionExpiredError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Run-wide breaker shared by all workers.
+
+    Each block signal opens it for an exponentially growing, jittered backoff; any
+    completed friend closes it again. After MAX_CONSECUTIVE_BLOCKS it gives up.
+    """
+
+    def __init__(self):
+        self.consecutive_blocks = 0
+        self.open_until = 0.0
+
+    @property
+    def gave_up(self):
+        return self.consecutive_blocks >= MAX_CONSECUTIVE_BLOCKS
+
+    def record_block(self):
+        self.consecutive_blocks += 1
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.consecutive_blocks - 1))
+        # "Equal jitter": at least half the backoff, so workers don't all come back at once
+        delay = random.uniform(delay / 2, delay)
+        self.open_until = max(self.open_until, time.monotonic() + delay)
+        return delay
+
+    def record_success(self):
+        self.consecutive_blocks = 0
+
+    async def wait_until_closed(self, log, stop=None):
+        # Returns early if the run is stopped in the meantime
+        remaining = self.open_until - time.monotonic()
+        if remaining <= 0:
+            return
+        log.info(f"Circuit breaker open, backing off {remaining:.0f}s before the next friend")
+        if stop is None:
+            await asyncio.sleep(remaining)
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JitterBudget:
+    # Random pauses for one friend, drawn from a fixed budget of seconds
+    def __init__(self, report, seconds=JITTER_BUDGET):
+        self.report = report
+        self.remaining = seconds
+
+    async def pause(self, share=0.3):
+        if self.remaining <= 0:
+            return
+        delay = random.uniform(0, self.remaining * share)
+        self.remaining -= delay
+        self.report["actual_wait"] += delay
+        await asyncio.sleep(delay)
+
+
+def should_block(resource_type, url):
+    if any(pattern in url for pattern in ALLOW_URL_PATTERNS):
+        return False
+    if resource_type in BLOCK_RESOURCE_TYPES:
+        return True
+    return any(pattern in url for pattern in BLOCK_URL_PATTERNS)
+
+
+def content_length(headers):
+    # DevTools gives headers as [{name, value}], Playwright as a dict with lower-case names
+    if isinstance(headers, list):
+        headers = {h["name"].lower(): h["value"] for h in headers}
+    try:
+        return int(headers.get("content-length", 0))
+    except ValueError:
+        return 0
+
+
+async def install_resource_filter(context, report):
+    # Count what got through; the blocking itself happens per page in open_page()
+    def count_response(response):
+        report["allowed_requests"] += 1
+        report["downloaded_bytes"] += content_length(response.headers)
+
+    context.on("response", count_response)
+
+
+async def open_page(context, report):
+    """Open a page that drops BLOCK_RESOURCE_TYPES and BLOCK_URL_PATTERNS requests.
+
+    This uses the DevTools Fetch domain rather than context.route(): Playwright turns the
+    HTTP cache off while any route is installed and sends every request through Python.
+    Here only requests that may be blocked are paused, and the cache stays on.
+    URL patterns are stopped before the request is sent, so beacons never leave the browser.
+    Blocked resource types are stopped once their headers arrive, before the body is
+    downloaded, so their Content-Length can be counted as blocked bytes.
+    """
+    page = await context.new_page()
+    patterns = [{"urlPattern": f"*{pattern}*", "requestStage": "Request"} for pattern in BLOCK_URL_PATTERNS]
+    patterns += [
+        {"urlPattern": "*", "resourceType": CDP_RESOURCE_TYPES.get(t, t.capitalize()), "requestStage": "Response"}
+        for t in sorted(BLOCK_RESOURCE_TYPES)
+    ]
+    if not patterns:
+        return page
+    cdp = await context.new_cdp_session(page)
+
+    async def handle_paused(event):
+        resource_type = event.get("resourceType", "Other").lower()
+        try:
+            if not should_block(resource_type, event["request"]["url"]):
+                await cdp.send("Fetch.continueRequest", {"requestId": event["requestId"]})
+                return
+            report["blocked_requests"] += 1
+            report["blocked_bytes"] += content_length(event.get("responseHeaders", []))
+            blocked_by_type = report["blocked_by_type"]
+            blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+            await cdp.send("Fetch.failRequest", {"requestId": event["requestId"], "errorReason": "BlockedByClient"})
+        except Exception:
+            # The page was closed or navigated away while the request was paused
+            pass
+
+    cdp.on("Fetch.requestPaused", lambda event: asyncio.ensure_future(handle_paused(event)))
+    await cdp.send("Fetch.enable", {"patterns": patterns})
+    return page
+
+
+class SelectorResolver:
+    """Races every candidate selector for a role and returns the first visible one.
+
+    Wins are counted per role and selector and saved to SELECTOR_STATS_PATH, so the
+    usual winner is preferred when several match at once and hit rates show markup changes.
+    """
+
+    def __init__(self, path=SELECTOR_STATS_PATH):
+        self.path = path
+        self.stats = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.stats = json.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable selector stats {path}: {str(e)}")
+
+    def ranked(self, role, selectors):
+        wins = self.stats.get(role, {}).get("wins", {})
+        # Stable sort: selectors that never won keep their hand-written order
+        return sorted(selectors, key=lambda selector: -wins.get(selector, 0))
+
+    async def race(self, page, role, selectors, timeout):
+        """Return (selector, locator) for the first visible candidate, or (None, None)."""
+        ranked = self.ranked(role, selectors)
+        tasks = {
+            asyncio.ensure_future(page.locator(selector).first.wait_for(state="visible", timeout=timeout)): selector
+            for selector in ranked
+        }
+        winner = None
+        pending = set(tasks)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                visible = [tasks[task] for task in done if not task.cancelled() and task.exception() is None]
+                if visible:
+                    winner = min(visible, key=ranked.index)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        role_stats = self.stats.setdefault(role, {"tries": 0, "misses": 0, "wins": {}})
+        role_stats["tries"] += 1
+        if winner is None:
+            role_stats["misses"] += 1
+            return None, None
+        role_stats["wins"][winner] = role_stats["wins"].get(winner, 0) + 1
+        return winner, page.locator(winner).first
+
+    def hit_rates(self):
+        lines = []
+        for role, role_stats in sorted(self.stats.items()):
+            tries = role_stats["tries"] or 1
+            rates = ", ".join(
+                f"{selector} {wins / tries:.0%}"
+                for selector, wins in sorted(role_stats["wins"].items(), key=lambda item: -item[1])
+            )
+            lines.append(f"{role}: {role_stats['tries']} lookups, {role_stats['misses'] / tries:.0%} missed ({rates or 'no hits'})")
+        return lines
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.stats, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save selector stats: {str(e)}")
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile, good enough for a few dozen friends
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+class Timings:
+    """Timing spans for each friend and phase, appended to TIMINGS_PATH as JSON lines.
+
+    Phases: profile, uid, chat_open, history, history_step, send and friend (the total,
+    once per attempt, with its outcome).
+    close() appends a summary line with p50/p95 per phase and the slowest friends.
+    """
+
+    def __init__(self, path=TIMINGS_PATH):
+        self.run_id = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.durations = {}
+        self.friend_totals = {}
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def record(self, friend, phase, started=None, seconds=None, **fields):
+        if seconds is None:
+            seconds = time.monotonic() - started
+        self.durations.setdefault(phase, []).append(seconds)
+        if phase == "friend":
+            self.friend_totals[friend] = seconds
+        self.write({
+            "type": "span", "run": self.run_id, "time": time.strftime("%H:%M:%S"),
+            "friend": friend, "phase": phase, "seconds": round(seconds, 3), **fields
+        })
+        return seconds
+
+    def summary(self, slowest=5):
+        phases = {
+            phase: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "total": round(sum(values), 3)
+            }
+            for phase, values in sorted(self.durations.items())
+        }
+        slowest_friends = sorted(self.friend_totals.items(), key=lambda item: item[1], reverse=True)[:slowest]
+        return {
+            "type": "summary", "run": self.run_id, "phases": phases,
+            "slowest_friends": [{"friend": f, "seconds": round(sec, 3)} for f, sec in slowest_friends]
+        }
+
+    def close(self):
+        summary = self.summary()
+        self.write(summary)
+        self.file.close()
+        return summary
+
+
+async def ready_wait(report, legacy_seconds, awaitable):
+    """Await a readiness signal that replaced a fixed sleep of legacy_seconds.
+
+    A timeout is not an error here: the flow carries on just like it did after the old sleep.
+    """
+    start = time.monotonic()
+    try:
+        return await awaitable
+    except PlaywrightTimeoutError:
+        return None
+    finally:
+        report["legacy_wait"] += legacy_seconds
+        report["actual_wait"] += time.monotonic() - start
+
+
+def is_login_page(url):
+    return urlparse(url).path.startswith("/login")
+
+
+def normalize_username(friend):
+    # "@Name", "name" and "https://www.tiktok.com/@name?lang=en" all map to "name"
+    name = friend.strip()
+    if name.startswith("http"):
+        match = re.search(r'/@([^/?#]+)', name)
+        if match:
+            name = match.group(1)
+    return name.lstrip('@').lower()
+
+
+async def extract_user_id(page, username, timeout=10000):
+    # Wait for the rehydration script to exist, then parse it once. Polling the parse
+    # itself would re-read the multi-megabyte blob on every animation frame.
+    await page.wait_for_selector(
+        '#__UNIVERSAL_DATA_FOR_REHYDRATION__, #SIGI_STATE', state="attached", timeout=timeout
+    )
+    return await page.evaluate(JS_EXTRACT_USER_ID, username)
+
+
+async def insert_message(page, target, text, budget):
+    await page.keyboard.insert_text(text)
+
+
+async def paste_message(page, target, text, budget):
+    await page.evaluate(JS_PASTE_TEXT, [target, text])
+
+
+async def type_message(page, target, text, budget):
+    await page.keyboard.type(text, delay=budget * 1000 / max(1, len(text)))
+
+
+SEND_STRATEGIES = {"insert": insert_message, "paste": paste_message, "type": type_message}
+
+
+# Emoji, symbols, variation selectors and zero-width joiners, which often render as images
+EMOJI_PATTERN = re.compile("[\U00010000-\U0010FFFF\u2600-\u27BF\uFE00-\uFE0F\u200D]")
+
+
+def message_probe(text):
+    # Match on the longest stretch of text between emoji, since emoji may show up as images.
+    # Empty for an emoji-only message: then any new content (or new bubble) has to do.
+    runs = [run.strip() for run in EMOJI_PATTERN.split(text)]
+    return max(runs, key=len)[:20].strip()
+
+
+async def send_message(page, input_element, log, report, jitter, message=STREAK_MESSAGE):
+    """Put the message in the chat box, press Enter and wait for the new bubble.
+
+    SEND_STRATEGY is tried first, then the other strategies. With no input_element the
+    text goes to whatever has focus and can't be checked before sending.
+    Returns the strategy used. Raises SendNotConfirmedError when Enter was pressed
+    but no new bubble appeared.
+    """
+    first = SEND_STRATEGY if SEND_STRATEGY in SEND_STRATEGIES else "insert"
+    order = [first] + [name for name in SEND_STRATEGIES if name != first]
+    input_handle = await input_element.element_handle() if input_element else None
+    if input_handle:
+        await input_element.focus()
+        await input_element.click()
+        await ready_wait(report, 2, page.wait_for_function(
+            "el => el === document.activeElement || el.contains(document.activeElement)",
+            arg=input_handle, timeout=2000
+        ))
+        await jitter.pause()
+
+    used = None
+    for name in order:
+        await SEND_STRATEGIES[name](page, input_handle, message, SEND_BUDGET)
+        if not input_handle:
+            used = name
+            break
+        filled = await ready_wait(report, 2, page.wait_for_function(
+            "([el, text]) => text ? (el.innerText || '').includes(text) : !!((el.innerText || '').trim() || el.querySelector('img'))",
+            arg=[input_handle, message_probe(message)], timeout=SEND_BUDGET * 1000 + 1000
+        ))
+        if filled:
+            used = name
+            break
+        log.warning(f"Send strategy '{name}' did not fill the input, trying the next one")
+        # Clear whatever partial text the strategy left behind
+        await page.keyboard.press("Control+A")
+        await page.keyboard.press("Backspace")
+    if not used:
+        raise Exception("No send strategy could fill the chat input")
+
+    await jitter.pause()
+    await page.evaluate(JS_MARK_LAST_BUBBLE)
+    await page.keyboard.press("Enter")
+    if input_handle:
+        # The box clears once TikTok has taken the message
+        await ready_wait(report, 1, page.wait_for_function(
+            "el => !(el.innerText || '').trim()", arg=input_handle, timeout=1000
+        ))
+    await page.keyboard.press("Enter") # Double tap
+
+    try:
+        await page.wait_for_function(
+            JS_NEW_BUBBLE_WITH, arg=message_probe(message), timeout=SEND_CONFIRM_TIMEOUT * 1000
+        )
+    except PlaywrightTimeoutError:
+        raise SendNotConfirmedError(f"Message was submitted with '{used}' but no new bubble appeared")
+    return used
+
+
+async def session_is_alive(context):
+    """One authenticated API request instead of a full profile load.
+
+    Returns True or False, or None when TikTok couldn't be reached to tell.
+    """
+    try:
+        response = await context.request.get(f"{BASE_URL}{SESSION_CHECK_PATH}", timeout=15000)
+        if response.status in (401, 403):
+            return False
+        if not response.ok:
+            return None
+        data = (await response.json()).get("data") or {}
+        return bool(data.get("user_id") or data.get("user_id_str") or data.get("username"))
+    except Exception as e:
+        logger.warning(f"Session check could not reach TikTok: {str(e)}")
+        return None
+
+
+def cookie_fingerprint(cookies):
+    """Hash of the session cookie, to tell which cookies a saved browser state grew out of."""
+    session = [c.get("value", "") for c in cookies if c.get("name") == "sessionid"]
+    raw = session[0] if session else json.dumps(sorted(f"{c.get('name')}={c.get('value')}" for c in cookies))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def read_fingerprint(storage_state_path):
+    try:
+        with open(storage_state_path + ".fingerprint", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_fingerprint(storage_state_path, cookies):
+    try:
+        with open(storage_state_path + ".fingerprint", "w") as f:
+            f.write(cookie_fingerprint(cookies))
+    except OSError as e:
+        logger.warning(f"Failed to save the cookie fingerprint: {str(e)}")
+
+
+async def open_session(browser, cookies, storage_state_path=STORAGE_STATE_PATH):
+    """Return a logged-in context, preferring the browser state saved by the last run.
+
+    The saved state is dropped when TIKTOK_COOKIES no longer matches the cookies it grew out of.
+    Raises SessionExpiredError when neither the saved state nor the cookies are logged in.
+    """
+    options = {"user_agent": USER_AGENT, "viewport": {'width': 1280, 'height': 800}}
+    if os.path.exists(storage_state_path) and cookies is not None \
+            and read_fingerprint(storage_state_path) != cookie_fingerprint(cookies):
+        # New cookies were exported (e.g. another account), so they win over yesterday's session
+        logger.info(f"TIKTOK_COOKIES changed since {storage_state_path} was saved. Discarding the saved state.")
+        os.remove(storage_state_path)
+    if os.path.exists(storage_state_path):
+        context = await browser.new_context(storage_state=storage_state_path, **options)
+        alive = await session_is_alive(context)
+        if alive is not False:
+            logger.info(f"Reusing saved browser state from {storage_state_path} (session check: {'ok' if alive else 'unknown'})")
+            return context
+        logger.warning("Saved browser state is logged out. Falling back to TIKTOK_COOKIES.")
+        await context.close()
+
+    if cookies is not None:
+        context = await browser.new_context(**options)
+        # Add cookies to context
+        await context.add_cookies(cookies)
+        alive = await session_is_alive(context)
+        if alive is not False:
+            logger.info(f"Session check: {'ok' if alive else 'unknown, continuing anyway'}")
+            return context
+        await context.close()
+    raise SessionExpiredError("Cookies expired or invalid. Export fresh cookies with get_cookies.py and update TIKTOK_COOKIES.")
+
+
+def load_uid_cache():
+    if not os.path.exists(UID_CACHE_PATH):
+        return {}
+    try:
+        with open(UID_CACHE_PATH, "r") as f:
+            cache = json.load(f)
+        logger.info(f"Loaded {len(cache)} cached user IDs from {UID_CACHE_PATH}")
+        return cache
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable user ID cache {UID_CACHE_PATH}: {str(e)}")
+        return {}
+
+
+def save_uid_cache(cache):
+    # Write to a temp file first so a killed run never leaves a half-written cache
+    tmp_path = UID_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, UID_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Failed to save user ID cache: {str(e)}")
+
+
+def in_shard(friend, shard_index, shard_count):
+    # sha1 rather than hash(): it must give the same answer on every runner and run
+    digest = hashlib.sha1(normalize_username(friend).encode("utf-8")).hexdigest()
+    return int(digest, 16) % shard_count == shard_index
+
+
+def result_path(shard_index, shard_count, account=None):
+    prefix = f"streak_result_{account}_" if account else "streak_result_"
+    return os.path.join(RESULT_DIR, f"{prefix}{shard_index}_of_{shard_count}.json")
+
+
+def write_result(shard_index, shard_count, total, report, logged_out, account=None):
+    result = {
+        "date": time.strftime("%Y-%m-%d"),
+        "account": account,
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "total": total,
+        "success": report["success"],
+        "failed": report["failed"],
+        "logged_out": logged_out
+    }
+    path = result_path(shard_index, shard_count, account)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    logger.info(f"Wrote shard result to {path}")
+
+
+def log_totals(total, success, failed):
+    logger.info(f"--- Automation Complete ---")
+    logger.info(f"Total Friends: {total}")
+    logger.info(f"Successful: {success}")
+    logger.info(f"Failed: {len(failed)}")
+    if failed:
+        logger.info(f"Failed friends: {', '.join(failed)}")
+
+
+def merge_results(paths):
+    """Combine shard result files into one report. Returns False if anything is missing."""
+    results = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results.append(json.load(f))
+        except Exception as e:
+            logger.error(f"Failed to read shard result {path}: {str(e)}")
+
+    complete = bool(results)
+    by_account = {}
+    for r in results:
+        by_account.setdefault(r.get("account"), []).append(r)
+    accounts = {}
+    for account, account_results in by_account.items():
+        label = f"Account {account}: " if account else ""
+        shard_count = account_results[0]["shard_count"]
+        missing = sorted(set(range(shard_count)) - {r["shard_index"] for r in account_results})
+        if missing:
+            logger.error(f"{label}Missing results for shards: {', '.join(str(i) for i in missing)} of {shard_count}")
+            complete = False
+        if any(r["logged_out"] for r in account_results):
+            logger.error(f"{label}At least one shard stopped early because the cookies expired.")
+            complete = False
+        accounts[account or "default"] = {
+            "total": sum(r["total"] for r in account_results),
+            "success": sum(r["success"] for r in account_results),
+            "failed": [friend for r in sorted(account_results, key=lambda r: r["shard_index"]) for friend in r["failed"]],
+            "logged_out": any(r["logged_out"] for r in account_results)
+        }
+
+    total = sum(a["total"] for a in accounts.values())
+    success = sum(a["success"] for a in accounts.values())
+    failed = [
+        f"{name}: {friend}" if len(accounts) > 1 else friend
+        for name, a in accounts.items() for friend in a["failed"]
+    ]
+    log_totals(total, success, failed)
+
+    merged = {
+        "date": results[0]["date"] if results else time.strftime("%Y-%m-%d"),
+        "shards": len(results),
+        "complete": complete,
+        "total": total,
+        "success": success,
+        "failed": failed,
+        "accounts": accounts
+    }
+    with open(os.path.join(RESULT_DIR, "streak_result_merged.json"), "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=2, ensure_ascii=False)
+    return complete
+
+
+def load_ledger(today, path=LEDGER_PATH):
+    """Return {normalized friend: outcome} for friends already done on the given date."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        data = f.read()
+    for line in data.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A run killed mid-write can leave a torn last line
+            continue
+        if entry.get("date") == today and entry.get("outcome") in LEDGER_DONE_OUTCOMES:
+            done[entry["friend"]] = entry["outcome"]
+    if data and not data.endswith("\n"):
+        # Terminate the torn line so the next append starts on a fresh one
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+    return done
+
+
+def append_ledger(friend, outcome, path=LEDGER_PATH):
+    entry = {
+        "date": time.strftime("%Y-%m-%d"),
+        "time": time.strftime("%H:%M:%S"),
+        "friend": normalize_username(friend),
+        "outcome": outcome
+    }
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    except Exception as e:
+        logger.warning(f"Failed to write ledger entry for {friend}: {str(e)}")
+
+
+async def plan_from_inbox(context, report, friends, log, ledger_path=LEDGER_PATH):
+    """Visit the messages inbox once and return the friends that still need a message today.
+
+    Friends whose conversation can't be found, or isn't clearly ours and from today,
+    stay in the plan. Any failure here falls back to processing everybody.
+    """
+    page = await open_page(context, report)
+    try:
+        await page.goto(f"{BASE_URL}/messages?lang=en", wait_until="load", timeout=60000)
+        if is_login_page(page.url):
+            log.warning("Inbox planning skipped: the inbox redirected to the login page.")
+            return friends
+        await page.wait_for_selector('[data-e2e="chat-list-item"], [class*="DivItemWrapper"]', timeout=15000)
+        conversations = await page.evaluate(JS_INBOX_READER, {
+            "todayStr": time.strftime("%Y-%m-%d"), "maxSteps": 20, "settleMs": 500
+        })
+    except Exception as e:
+        log.warning(f"Inbox planning failed, every friend will be checked in their chat: {str(e)}")
+        return friends
+    finally:
+        await page.close()
+
+    # Only the username from the conversation's profile link counts. Display names are
+    # free text, so one person's nickname could match another friend's username.
+    done = set()
+    for conversation in conversations:
+        if conversation["isToday"] and conversation["outgoing"] and conversation["uniqueId"]:
+            done.add(conversation["uniqueId"].lstrip('@').lower())
+
+    remaining = []
+    for friend in friends:
+        if normalize_username(friend) in done:
+            log.info(f"Skipped {friend} - inbox shows our message from today")
+            append_ledger(friend, "already_sent", ledger_path)
+        else:
+            remaining.append(friend)
+    log.info(f"Inbox planning: read {len(conversations)} conversations, {len(remaining)} of {len(friends)} friends still need a message")
+    return remaining
+
+
+def is_verification_title(title):
+    title = title.lower()
+    return "verify" in title or "captcha" in title or "cloudflare" in title
+
+
+async def open_chat(page, friend, target_url, log, captures):
+    """Open a chat URL and check for blocks or a dead session.
+
+    Returns None when the chat page is usable, otherwise "blocked" or "logged_out".
+    """
+    response = await page.goto(target_url, wait_until="load", timeout=60000)
+    if response and response.status == 429:
+        log.error(f"BOT BLOCKED: TikTok answered 429 Too Many Requests for {friend}.")
+        return "blocked"
+    if is_login_page(page.url):
+        log.error("Cookies expired or invalid. Bot is logged out.")
+        captures.snap(page, friend, "login_error")
+        return "logged_out"
+    # Report a block before the chat wait, which would otherwise time out and look like a failure
+    if is_verification_title(await page.title()):
+        log.error(f"BOT BLOCKED: TikTok is showing a Captcha/Verification screen for {friend}.")
+        captures.snap(page, friend, "blocked")
+        return "blocked"
+    return None
+
+
+async def open_profile(page, friend, profile_url, log, report, timings, captures):
+    """Load the friend's profile page and check for blocks or a dead session.
+
+    Returns None when the profile is usable, otherwise "failed", "blocked", "not_found" or "logged_out".
+    """
+    log.info(f"Navigating to profile: {profile_url}")
+    started = time.monotonic()
+    try:
+        # Use 'load' instead of 'networkidle' for better compatibility
+        response = await page.goto(profile_url, wait_until="load", timeout=60000)
+        if response and response.status == 429:
+            log.error(f"BOT BLOCKED: TikTok answered 429 Too Many Requests for {friend}.")
+            return "blocked"
+        # Profile data, or the page body of a block/not-found screen, means we can look at it
+        await ready_wait(report, 5, page.wait_for_selector(
+            '#__UNIVERSAL_DATA_FOR_REHYDRATION__, #SIGI_STATE, [data-e2e="user-page"], main',
+            state="attached", timeout=10000
+        ))
+        timings.record(friend, "profile", started)
+
+        # SUPER DEBUG: Only log title and check for blocks
+        title = await page.title()
+        log.info(f"Page Title: {title}")
+
+        # [NEW] Check for 'Not Found' or blocks (Robust fuzzy matching)
+        title_lower = title.lower()
+        if is_verification_title(title):
+            log.error(f"BOT BLOCKED: TikTok is showing a Captcha/Verification screen for {friend}.")
+            captures.snap(page, friend, "blocked")
+            return "blocked"
+
+        if "find this account" in title_lower or "not found" in title_lower:
+            log.error(f"PROFILE NOT FOUND: TikTok says the account for '{friend}' does not exist.")
+            captures.snap(page, friend, "not_found")
+            return "not_found"
+    except Exception as e:
+        timings.record(friend, "profile", started, ok=False)
+        log.error(f"Profile for {friend} failed to load: {str(e)}")
+        return "failed"
+
+    # Check if we are logged in
+    if is_login_page(page.url) or "Login" in await page.title():
+        log.error("Cookies expired or invalid. Bot is logged out.")
+        captures.snap(page, friend, "login_error")
+        return "logged_out"
+    return None
+
+
+async def process_friend(page, friend, log, account, uid_cache, report, timings, selectors, captures, attempt=1):
+    """Run the full streak flow for one friend on the given page, once.
+
+    Returns "sent", "already_sent", "failed", "blocked", "not_found" or "logged_out".
+    Retrying a failed friend is up to the caller.
+    """
+    log.info(f"Processing streak for: {friend}")
+    jitter = JitterBudget(report)
+    try:
+        clean_friend = friend.lstrip('@') if not friend.startswith("http") else friend
+        profile_url = f"{BASE_URL}/@{clean_friend}" if not clean_friend.startswith("http") else clean_friend
+        cache_key = normalize_username(friend)
+
+        # Known friends skip the profile page and go straight to the chat
+        cached_uid = uid_cache.get(cache_key)
+        chat_started = time.monotonic()
+        status = None
+        if cached_uid:
+            target_url = f"{BASE_URL}/messages?lang=en&u={cached_uid}"
+            log.info(f"Cached User ID {cached_uid} for {friend}. Jumping to: {target_url}")
+            try:
+                # A block here is not a stale cache entry, so it returns before the cache is touched
+                status = await open_chat(page, friend, target_url, log, captures)
+            except Exception as e:
+                log.warning(f"Invalidating cached User ID for {friend}, the chat failed to open: {str(e)}")
+                uid_cache.pop(cache_key, None)
+                cached_uid = None
+        if not cached_uid:
+            status = await open_profile(page, friend, profile_url, log, report, timings, captures)
+        if status:
+            return status
+
+        # A second pass only happens after dropping a stale cached user ID
+        for _ in range(2):
+            try:
+                # The cached chat is already open on the first attempt
+                found_btn = bool(cached_uid)
+
+                # NEW STRATEGY: Try to find the User ID in the page source data
+                if not found_btn:
+                    log.info("Attempting to extract User ID from page data...")
+                    uid_started = time.monotonic()
+                    try:
+                        # TikTok stores user data in a script tag. We read just that JSON blob.
+                        uid = await extract_user_id(page, None if cache_key.startswith("http") else cache_key)
+                        timings.record(friend, "uid", uid_started, attempt=attempt)
+                        chat_started = time.monotonic()
+                        if uid:
+                            uid_cache[cache_key] = uid
+                            target_url = f"{BASE_URL}/messages?lang=en&u={uid}"
+                            log.info(f"SUCCESS: Extracted User ID {uid}. Jumping to: {target_url}")
+                            status = await open_chat(page, friend, target_url, log, captures)
+                            if status:
+                                return status
+                            found_btn = True
+                    except Exception as uid_err:
+                        timings.record(friend, "uid", uid_started, attempt=attempt, ok=False)
+                        chat_started = time.monotonic()
+                        log.warning(f"User ID extraction failed: {str(uid_err)}")
+
+                if not found_btn:
+                    # 1. Standard Selectors, raced against each other
+                    selector, btn = await selectors.race(page, "message_button", MESSAGE_BUTTON_SELECTORS, timeout=5000)
+                    if btn:
+                        try:
+                            log.info(f"Clicking button found via: {selector}")
+                            await btn.click()
+                            found_btn = True
+                        except Exception as e:
+                            log.warning(f"Clicking {selector} failed: {str(e)}")
+
+                if not found_btn:
+                    # Nuclear Option: Click by text
+                    try:
+                        log.info("Trying to click text 'Message'...")
+                        await page.get_by_text("Message", exact=True).first.click()
+                        found_btn = True
+                    except:
+                        pass
+
+                if not found_btn:
+                    captures.snap(page, friend, f"missing_button_at_{attempt}")
+                    raise Exception("Could not find Message button, link, or User ID")
+
+                # 2. Wait for chat input to ensure chat has loaded
+                _, input_element = await ready_wait(report, 6.5, selectors.race(
+                    page, "chat_input", CHAT_INPUT_SELECTORS, timeout=15000
+                )) or (None, None)
+                found_input = input_element is not None
+                await jitter.pause()
+                timings.record(friend, "chat_open", chat_started, attempt=attempt, ok=found_input)
+
+                if not found_input and cached_uid:
+                    # A stale cache entry opens an empty chat, so drop it and go through the profile
+                    raise StaleUidError(f"Chat for cached User ID {cached_uid} did not open")
+
+                if not found_input:
+                    log.info("Input field not found yet. Will try blind typing later.")
+
+                # --- CHECK HISTORY ONCE CHAT IS OPEN ---
+                log.info("Checking if message was already sent today...")
+                captures.snap(page, friend, "chat") # [DEBUG] See what the bot sees
+
+                already_sent_today = False
+                today_str = time.strftime("%Y-%m-%d")
+
+                try:
+                    # TikTok uses virtual scrolling - only visible messages are in the DOM.
+                    # The scanner scrolls up inside the page until it can decide, in one round-trip.
+                    start = time.monotonic()
+                    scan = await page.evaluate(JS_HISTORY_SCANNER, {
+                        "todayStr": today_str, "maxSteps": 30, "stepPx": 500, "settleMs": 800,
+                        "loadTimeoutMs": 20000
+                    })
+                    report["legacy_wait"] += 0.8 * scan["steps"]
+                    report["actual_wait"] += timings.record(
+                        friend, "history", start, steps=scan["steps"], load_ms=round(scan["loadMs"])
+                    )
+                    for step, ms in enumerate(scan["stepMs"], start=1):
+                        timings.record(friend, "history_step", seconds=ms / 1000, step=step)
+                    result_str = scan["result"]
+                    log.info(f"History Check Result: {result_str} ({scan['steps']} scroll steps)")
+                    already_sent_today = result_str.startswith("SKIP")
+
+                except Exception as e:
+                    log.warning(f"Failed to check chat history (fail-open): {str(e)}")
+
+                if already_sent_today:
+                    log.info(f"Skipped {friend} - already sent today")
+                    return "already_sent"
+
+                # --- SEND MESSAGE ---
+                send_started = time.monotonic()
+                if found_input and input_element:
+                    try:
+                        strategy = await send_message(page, input_element, log, report, jitter, account["message"])
+                        timings.record(friend, "send", send_started, mode="input", strategy=strategy)
+
+                        log.info(f"Successfully sent message to {friend} (via {strategy})")
+                        return "sent"
+                    except SendNotConfirmedError:
+                        # Something was submitted, so retry (and re-check history) instead of blind typing
+                        raise
+                    except Exception as e:
+                        log.warning(f"Failed to type in input field: {str(e)}")
+                        found_input = False # Fallback to blind typing
+
+                if not found_input:
+                    # Blind typing attempt
+                    log.info("Input field not found. Trying Blind Typing...")
+                    for _ in range(3): await page.keyboard.press("Tab")
+                    report["legacy_wait"] += 2
+                    await jitter.pause()
+                    try:
+                        strategy = await send_message(page, None, log, report, jitter, account["message"])
+                    finally:
+                        captures.snap(page, friend, "blind_attempt")
+                    timings.record(friend, "send", send_started, mode="blind", strategy=strategy)
+                    log.info(f"Successfully sent message to {friend} (Blind Typing via {strategy})")
+                    return "sent"
+            except StaleUidError as e:
+                # Only a chat that doesn't open drops the entry; send errors are normal failures
+                log.warning(f"Invalidating cached User ID for {friend}: {str(e)}")
+                uid_cache.pop(cache_key, None)
+                cached_uid = None
+                status = await open_profile(page, friend, profile_url, log, report, timings, captures)
+                if status:
+                    return status
+
+    except PlaywrightTimeoutError:
+        log.error(f"Timeout while processing {friend}. The UI might have changed or the user was not found.")
+    except Exception as e:
+        log.error(f"An error occurred for {friend}: {str(e)}")
+    return "failed"
+
+
+class Captures:
+    """Screenshots buffered per friend and written out only when the friend's outcome calls for it.
+
+    snap() doesn't wait for the screenshot. Each friend keeps its newest captures up to
+    CAPTURE_FRIEND_KB; finish() writes them as <prefix>_<friend>_<n>_<label>.jpg.
+    written_bytes carries the CAPTURE_RUN_MB budget over from a previous account.
+    """
+
+    def __init__(self, mode=CAPTURE_MODE, prefix="capture", written_bytes=0):
+        if mode not in ("failures", "sampled", "always"):
+            logger.warning(f"Unknown CAPTURE_MODE '{mode}', using 'failures'")
+            mode = "failures"
+        self.mode = mode
+        self.prefix = prefix
+        self.buffers = {}
+        self.pending = {}
+        self.counters = {}
+        self.run_limit = int(CAPTURE_RUN_MB * 1024 * 1024)
+        self.written = 0
+        self.written_bytes = written_bytes
+        self.dropped = 0
+
+    def snap(self, page, friend, label):
+        self.counters[friend] = self.counters.get(friend, 0) + 1
+        name = f"{self.counters[friend]:02d}_{label}"
+        task = asyncio.ensure_future(self._take(page, friend, name))
+        self.pending.setdefault(friend, []).append(task)
+
+    async def _take(self, page, friend, name):
+        try:
+            data = await page.screenshot(type="jpeg", quality=CAPTURE_QUALITY)
+        except Exception as e:
+            logger.debug(f"Screenshot {name} for {friend} failed: {str(e)}")
+            return
+        buffer = self.buffers.setdefault(friend, deque())
+        buffer.append((name, data))
+        # Drop the oldest captures first, but always keep the newest one
+        while len(buffer) > 1 and sum(len(d) for _, d in buffer) > CAPTURE_FRIEND_KB * 1024:
+            buffer.popleft()
+
+    async def settle(self, friend):
+        # Wait for the friend's screenshots before its page moves on to somebody else
+        tasks = self.pending.pop(friend, [])
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def finish(self, friend, outcome):
+        await self.settle(friend)
+        buffer = self.buffers.pop(friend, None)
+        self.counters.pop(friend, None)
+        if not buffer:
+            return
+        keep = (
+            outcome in CAPTURE_FAILED_OUTCOMES or self.mode == "always"
+            or (self.mode == "sampled" and random.random() < CAPTURE_SAMPLE_RATE)
+        )
+        if not keep:
+            return
+        safe_name = "".join([c for c in normalize_username(friend) if c.isalnum() or c in ("-", "_")])
+        for name, data in buffer:
+            if self.written_bytes + len(data) > self.run_limit:
+                self.dropped += 1
+                continue
+            with open(f"{self.prefix}_{safe_name}_{name}.jpg", "wb") as f:
+                f.write(data)
+            self.written += 1
+            self.written_bytes += len(data)
+
+    async def close(self):
+        # Friends still buffered here never got a final outcome because the run was stopped
+        for friend in list(set(self.pending) | set(self.buffers)):
+            await self.finish(friend, "failed")
+        return {"written": self.written, "dropped": self.dropped}
+
+
+class WorkerLogAdapter(logging.LoggerAdapter):
+    # Prefix every line with the account and worker id so interleaved logs stay readable
+    def process(self, msg, kwargs):
+        if self.extra.get("worker") is not None:
+            msg = f"[worker {self.extra['worker']}] {msg}"
+        if self.extra.get("account"):
+            msg = f"[{self.extra['account']}] {msg}"
+        return msg, kwargs
+
+
+async def friend_worker(worker_id, account, context, queue, report, stop, breaker, attempts, uid_cache, timings, selectors, captures):
+    # Each worker owns one page and keeps pulling friends until the account is finished or stopped
+    log = WorkerLogAdapter(logger, {"worker": worker_id if CONCURRENCY > 1 else None, "account": account["name"]})
+    page = await open_page(context, report)
+    try:
+        while not stop.is_set():
+            # Back off before taking a friend, so nobody sits in a waiting worker
+            await breaker.wait_until_closed(log, stop)
+            if stop.is_set():
+                break
+            friend = await queue.get()
+            try:
+                if friend is None:
+                    # Wake-up call from run_account after the run was stopped
+                    break
+                # A block may have been recorded while this worker sat in queue.get()
+                await breaker.wait_until_closed(log, stop)
+                if stop.is_set():
+                    # Leave it in the queue, where the leftovers get counted as failed
+                    queue.put_nowait(friend)
+                    break
+                attempts[friend] = attempts.get(friend, 0) + 1
+
+                started = time.monotonic()
+                outcome = await process_friend(
+                    page, friend, log, account, uid_cache, report, timings, selectors, captures, attempts[friend]
+                )
+                report["friend_seconds"][friend] = timings.record(
+                    friend, "friend", started, outcome=outcome, attempt=attempts[friend]
+                )
+                await captures.settle(friend)
+                if outcome == "logged_out":
+                    # No point in continuing for anybody, the session is shared
+                    stop.set()
+                elif outcome == "blocked":
+                    delay = breaker.record_block()
+                    if breaker.gave_up:
+                        log.error(f"Giving up: {breaker.consecutive_blocks} blocks in a row. TikTok is blocking this run.")
+                        stop.set()
+                    else:
+                        log.warning(f"Block detected, pausing all workers for {delay:.0f}s")
+                elif outcome != "failed":
+                    breaker.record_success()
+
+                if outcome in ("failed", "blocked") and attempts[friend] < MAX_FRIEND_ATTEMPTS and not stop.is_set():
+                    # Retry later instead of hammering the same page straight away
+                    log.info(f"Re-queuing {friend} (attempt {attempts[friend]} of {MAX_FRIEND_ATTEMPTS})")
+                    queue.put_nowait(friend)
+                else:
+                    append_ledger(friend, outcome, account["ledger"])
+                    await captures.finish(friend, outcome)
+                    if outcome in LEDGER_DONE_OUTCOMES:
+                        report["success"] += 1
+                    else:
+                        report["failed"].append(friend)
+            finally:
+                queue.task_done()
+
+            if queue.empty() or stop.is_set():
+                continue
+
+            # Longer randomized delay between different friends (15-30 seconds by default)
+            # This is crucial for "All-In" with 42 friends
+            wait_time = random.uniform(*FRIEND_DELAY)
+            log.info(f"Waiting {wait_time:.2f} seconds before next friend...")
+            await asyncio.sleep(wait_time)
+    finally:
+        await page.close()
+
+
+def parse_friends(friends_raw):
+    # Handle both commas and newlines as separators, or a ready-made list
+    if isinstance(friends_raw, list):
+        friends_raw = ",".join(str(f) for f in friends_raw)
+    return [f.strip() for f in (friends_raw or "").replace("\n", ",").split(",") if f.strip()]
+
+
+def account_path(path, name):
+    # "sent_ledger.jsonl" becomes "sent_ledger_<name>.jsonl" so accounts never share state
+    if not name:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+
+def parse_cookies(cookies, label):
+    """Accept cookies as a list or a JSON string. Returns None (and logs) when unusable."""
+    if isinstance(cookies, str):
+        try:
+            cookies = json.loads(cookies)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse cookies for {label}. Ensure it is a valid JSON string.")
+            return None
+    if not isinstance(cookies, list):
+        logger.error(f"Cookies for {label} must be a JSON list.")
+        return None
+    return cookies
+
+
+def make_account(name, cookies, friends, message):
+    return {
+        "name": name,
+        "cookies": cookies,
+        "friends": friends,
+        "message": message or STREAK_MESSAGE,
+        "storage_state": account_path(STORAGE_STATE_PATH, name),
+        "ledger": account_path(LEDGER_PATH, name)
+    }
+
+
+def load_default_account():
     # Load configuration from environment variables
     # FRIENDS_LIST should be a comma-separated list of TikTok usernames or profile URLs
     friends_raw = os.getenv("FRIENDS_LIST", "")
-    
+
     if not friends_raw and os.path.exists("friends.txt"):
         with open("friends.txt", "r") as f:
             friends_raw = ",".join([line.strip() for line in f if line.strip()])
-            
-    # Handle both commas and newlines as separators
-    friends = []
-    if friends_raw:
-        # Replace newlines with commas, then split and strip
-        friends = [f.strip() for f in friends_raw.replace("\n", ",").split(",") if f.strip()]
-    
+
     # COOKIES_JSON should be the content of the cookies file as a string
     cookies_str = os.getenv("TIKTOK_COOKIES")
-    
+
     # [NEW] Fallback to cookies.json if env var is missing (helpful for local testing)
     if not cookies_str and os.path.exists("cookies.json"):
         logger.info("TIKTOK_COOKIES env var not found. Loading from cookies.json...")
@@ -47,349 +1517,248 @@ def run_automation():
         except Exception as e:
             logger.error(f"Failed to read cookies.json: {str(e)}")
 
-    if not cookies_str:
+    cookies = None
+    if cookies_str:
+        cookies = parse_cookies(cookies_str, "TIKTOK_COOKIES")
+        if cookies is None:
+            return None
+    elif os.path.exists(STORAGE_STATE_PATH):
+        logger.info(f"TIKTOK_COOKIES is missing, relying on the saved browser state in {STORAGE_STATE_PATH}")
+    else:
         logger.error("TIKTOK_COOKIES is missing (check your GitHub Secrets or cookies.json)!")
-        return
+        return None
+    return make_account(None, cookies, parse_friends(friends_raw), None)
+
+
+def load_accounts():
+    """Return the accounts to run from ACCOUNTS or ACCOUNTS_FILE, else the single default account.
+
+    Accounts with broken settings are logged and left out. Returns [] when nothing can run.
+    """
+    accounts_raw = os.getenv("ACCOUNTS")
+    if not accounts_raw and os.path.exists(ACCOUNTS_FILE):
+        logger.info(f"Loading accounts from {ACCOUNTS_FILE}...")
+        with open(ACCOUNTS_FILE, "r", encoding="utf-8") as f:
+            accounts_raw = f.read()
+    if not accounts_raw:
+        account = load_default_account()
+        return [account] if account else []
 
     try:
-        cookies = json.loads(cookies_str)
+        entries = json.loads(accounts_raw)
     except json.JSONDecodeError:
-        logger.error("Failed to parse cookies. Ensure it is a valid JSON string.")
-        return
+        logger.error("Failed to parse ACCOUNTS. Ensure it is a valid JSON list.")
+        return []
 
-    with sync_playwright() as p:
-        # Launch browser
-        browser = p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-            viewport={'width': 1280, 'height': 800}
-        )
-        
-        # Add cookies to context
-        context.add_cookies(cookies)
-        
-        page = context.new_page()
-        
-        success_count = 0
-        failed_friends = []
-
-        for friend in friends:
-            logger.info(f"Processing streak for: {friend}")
+    accounts = []
+    for i, entry in enumerate(entries if isinstance(entries, list) else []):
+        if not isinstance(entry, dict):
+            logger.error(f"Account {i + 1} in ACCOUNTS is not a JSON object. Skipping it.")
+            continue
+        name = "".join(c for c in str(entry.get("name") or f"account{i + 1}") if c.isalnum() or c in ("-", "_"))
+        if any(a["name"] == name for a in accounts):
+            logger.error(f"Account name '{name}' is used twice. Skipping the second one.")
+            continue
+        cookies = entry.get("cookies")
+        if cookies is None and entry.get("cookies_env"):
+            cookies = os.getenv(entry["cookies_env"]) or None
+        if cookies is not None:
+            cookies = parse_cookies(cookies, f"account {name}")
+            if cookies is None:
+                continue
+        elif not os.path.exists(account_path(STORAGE_STATE_PATH, name)):
+            logger.error(f"Account {name} has no cookies and no saved browser state. Skipping it.")
+            continue
+        accounts.append(make_account(name, cookies, parse_friends(entry.get("friends")), entry.get("message")))
+    if not accounts:
+        logger.error("ACCOUNTS does not contain any usable account.")
+    return accounts
+
+
+async def run_account(browser, account, shard_index, shard_count, uid_cache, timings, selectors, captures):
+    """Run every friend of one account in its own browser context and return its report."""
+    name = account["name"]
+    label = f"Account {name}: " if name else ""
+    friends = account["friends"]
+    if shard_count > 1:
+        friends = [f for f in friends if in_shard(f, shard_index, shard_count)]
+        logger.info(f"{label}Shard {shard_index + 1} of {shard_count}: {len(friends)} friends")
+
+    report = {
+        "success": 0, "failed": [], "legacy_wait": 0.0, "actual_wait": 0.0,
+        "blocked_requests": 0, "blocked_bytes": 0, "blocked_by_type": {}, "allowed_requests": 0, "downloaded_bytes": 0,
+        "friend_seconds": {}, "logged_out": False, "total": len(friends)
+    }
+    # The ledger needs no browser, so a rerun after everybody is done doesn't depend on the session
+    done_today = load_ledger(time.strftime("%Y-%m-%d"), account["ledger"])
+    pending = []
+    for friend in friends:
+        if normalize_username(friend) in done_today:
+            logger.info(f"{label}Skipped {friend} - ledger says {done_today[normalize_username(friend)]} today")
+            report["success"] += 1
+            continue
+        pending.append(friend)
+    if not pending:
+        logger.info(f"{label}Everybody is done for today, skipping the browser")
+        write_result(shard_index, shard_count, len(friends), report, False, name)
+        return report
+
+    try:
+        context = await open_session(browser, account["cookies"], account["storage_state"])
+    except SessionExpiredError as e:
+        logger.error(f"{label}{str(e)}")
+        report["logged_out"] = True
+        # Record the dead session so a sharded merge fails loudly too
+        write_result(shard_index, shard_count, len(friends), report, True, name)
+        return report
+
+    await install_resource_filter(context, report)
+    queue = asyncio.Queue()
+    if INBOX_PLANNING and pending:
+        planned = await plan_from_inbox(context, report, pending, WorkerLogAdapter(logger, {"account": name}), account["ledger"])
+        report["success"] += len(pending) - len(planned)
+        pending = planned
+    for friend in pending:
+        queue.put_nowait(friend)
+    stop = asyncio.Event()
+    breaker = CircuitBreaker()
+    attempts = {}
+
+    workers = min(CONCURRENCY, queue.qsize())
+    logger.info(f"{label}Processing {queue.qsize()} of {len(friends)} friends with {workers} worker(s)")
+    worker_tasks = [
+        asyncio.ensure_future(friend_worker(
+            i + 1, account, context, queue, report, stop, breaker, attempts, uid_cache, timings, selectors, captures
+        ))
+        for i in range(workers)
+    ]
+    try:
+        # Done when every queued (and re-queued) friend is finished, or a worker stops the run
+        finished = asyncio.ensure_future(queue.join())
+        stopped = asyncio.ensure_future(stop.wait())
+        all_workers = asyncio.gather(*worker_tasks, return_exceptions=True)
+        await asyncio.wait([finished, stopped, all_workers], return_when=asyncio.FIRST_COMPLETED)
+        finished.cancel()
+        stopped.cancel()
+        if stop.is_set():
+            # Let friends already in flight finish, and wake the idle workers so they exit
+            for _ in worker_tasks:
+                queue.put_nowait(None)
+        else:
+            # Every friend is done, so the workers are all idle
+            for task in worker_tasks:
+                task.cancel()
+        results = await all_workers
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"{label}Worker crashed: {str(result)}")
+
+        # Everybody left over was never reached because the run was stopped
+        while not queue.empty():
+            friend = queue.get_nowait()
+            if friend is not None and friend not in report["failed"]:
+                report["failed"].append(friend)
+    finally:
+        if not stop.is_set() or breaker.gave_up:
+            # Keep the session TikTok refreshed during the run for next time
             try:
-                # Navigate to the profile page
-                clean_friend = friend.lstrip('@') if not friend.startswith("http") else friend
-                profile_url = f"https://www.tiktok.com/@{clean_friend}" if not clean_friend.startswith("http") else clean_friend
-                logger.info(f"Navigating to profile: {profile_url}")
-                
+                await context.storage_state(path=account["storage_state"])
+                if account["cookies"] is not None:
+                    write_fingerprint(account["storage_state"], account["cookies"])
+            except Exception as e:
+                logger.warning(f"{label}Failed to save browser state: {str(e)}")
+        await context.close()
+
+    report["logged_out"] = stop.is_set() and not breaker.gave_up
+    write_result(shard_index, shard_count, len(friends), report, report["logged_out"], name)
+    return report
+
+
+async def run_automation(shard_index=SHARD_INDEX, shard_count=SHARD_COUNT):
+    accounts = load_accounts()
+    if not accounts:
+        return
+
+    uid_cache = load_uid_cache()
+    timings = Timings()
+    selectors = SelectorResolver()
+    reports = {}
+    capture_bytes = 0
+    capture_counts = {"written": 0, "dropped": 0}
+
+    async with async_playwright() as p:
+        # One browser for every account; each account gets its own isolated context
+        browser = await p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
+        try:
+            for account in accounts:
+                prefix = f"capture_{account['name']}" if account["name"] else "capture"
+                captures = Captures(prefix=prefix, written_bytes=capture_bytes)
                 try:
-                    # Use 'load' instead of 'networkidle' for better compatibility
-                    page.goto(profile_url, wait_until="load", timeout=60000)
-                    time.sleep(5)
-                    
-                    # SUPER DEBUG: Only log title and check for blocks
-                    title = page.title()
-                    logger.info(f"Page Title: {title}")
-                    # Sanitize friend name for filename
-                    safe_name = "".join([c for c in clean_friend if c.isalnum() or c in (" ", "-", "_")]).strip()
-
-                    # [NEW] Check for 'Not Found' or blocks (Robust fuzzy matching)
-                    title_lower = title.lower()
-                    if "verify" in title_lower or "captcha" in title_lower or "cloudflare" in title_lower:
-                        logger.error(f"BOT BLOCKED: TikTok is showing a Captcha/Verification screen for {friend}.")
-                        page.screenshot(path=f"blocked_{safe_name}.png")
-                        failed_friends.append(friend)
-                        continue
-                    
-                    if "find this account" in title_lower or "not found" in title_lower:
-                        logger.error(f"PROFILE NOT FOUND: TikTok says the account for '{friend}' does not exist.")
-                        page.screenshot(path=f"not_found_{safe_name}.png")
-                        failed_friends.append(friend)
-                        continue
-                except Exception as e:
-                    logger.error(f"Profile for {friend} failed to load: {str(e)}")
-                    failed_friends.append(friend)
-                    continue
-
-                # Check if we are logged in
-                if "tiktok.com/login" in page.url or "Login" in page.title():
-                    logger.error("Cookies expired or invalid. Bot is logged out.")
-                    page.screenshot(path="login_error.png")
-                    break
+                    reports[account["name"]] = await run_account(
+                        browser, account, shard_index, shard_count, uid_cache, timings, selectors, captures
+                    )
+                finally:
+                    summary = await captures.close()
+                    capture_bytes = captures.written_bytes
+                    capture_counts["written"] += summary["written"]
+                    capture_counts["dropped"] += summary["dropped"]
+        finally:
+            save_uid_cache(uid_cache)
+            selectors.save()
+            timing_summary = timings.close()
+            await browser.close()
 
-                # Try to send message with retries
-                for attempt in range(3):
-                    try:
-                        found_btn = False
-                        
-                        # NEW STRATEGY: Try to find the User ID in the page source data
-                        logger.info("Attempting to extract User ID from page data...")
-                        try:
-                            # TikTok stores user data in a script tag. We can try to find the ID there.
-                            page_content = page.content()
-                            import re
-                            # Look for "userId":"12345..." or similar patterns
-                            user_id_match = re.search(r'"userId":"(\d+)"', page_content)
-                            if not user_id_match:
-                                user_id_match = re.search(r'"id":"(\d+)"', page_content)
-                                
-                            if user_id_match:
-                                uid = user_id_match.group(1)
-                                target_url = f"https://www.tiktok.com/messages?lang=en&u={uid}"
-                                logger.info(f"SUCCESS: Extracted User ID {uid}. Jumping to: {target_url}")
-                                page.goto(target_url, wait_until="load")
-                                found_btn = True
-                        except Exception as uid_err:
-                            logger.warning(f"User ID extraction failed: {str(uid_err)}")
-
-                        if not found_btn:
-                            # 1. Standard Selectors
-                            message_btn_selectors = [
-                                '[data-e2e="message-button"]', 
-                                'button:has-text("Message")',
-                                'div[role="button"]:has-text("Message")',
-                                'main a[href*="/messages"]'
-                            ]
-                            
-                            for selector in message_btn_selectors:
-                                try:
-                                    btn = page.locator(selector).first
-                                    if btn.count() > 0 and btn.is_visible():
-                                        logger.info(f"Clicking button found via: {selector}")
-                                        btn.click()
-                                        found_btn = True
-                                        break
-                                except:
-                                    continue
-                        
-                        if not found_btn:
-                            # Nuclear Option: Click by text
-                            try:
-                                logger.info("Trying to click text 'Message'...")
-                                page.get_by_text("Message", exact=True).first.click()
-                                found_btn = True
-                            except:
-                                pass
-
-                        if not found_btn:
-                            page.screenshot(path=f"missing_button_{safe_name}_at_{attempt+1}.png")
-                            raise Exception("Could not find Message button, link, or User ID")
-
-                        # 2. Wait for chat input to ensure chat has loaded
-                        time.sleep(random.uniform(5, 8)) # Give it some time to load
-                        
-                        chat_input_selectors = [
-                            '[data-e2e="message-input-area"] [contenteditable="true"]',
-                            '[contenteditable="true"]',
-                            '.public-DraftEditor-content',
-                            '[role="textbox"]'
-                        ]
-                        
-                        found_input = False
-                        input_element = None
-                        for selector in chat_input_selectors:
-                            try:
-                                el = page.locator(selector).first
-                                if el.is_visible(timeout=5000):
-                                    input_element = el
-                                    found_input = True
-                                    break
-                            except:
-                                continue
-
-                        if not found_input:
-                            logger.info("Input field not found yet. Will try blind typing later.")
-
-                        # --- CHECK HISTORY ONCE CHAT IS OPEN ---
-                        logger.info("Checking if message was already sent today...")
-                        page.screenshot(path=f"debug_chat_{safe_name}.png") # [DEBUG] See what the bot sees
-                        
-                        already_sent_today = False
-                        today_str = time.strftime("%Y-%m-%d")
-                        
-                        try:
-                            # TikTok uses virtual scrolling - only visible messages are in the DOM.
-                            # We scroll up step-by-step, checking at each position, to find our outgoing message.
-                            result_str = "SEND: No timestamps found in chat."
-                            
-                            js_check = """(today_str) => {
-                                const allElements = Array.from(document.querySelectorAll('[class*="DivTimeContainer"], [class*="DivChatItemWrapper"]'));
-                                
-                                if (allElements.length === 0) return "CONTINUE: No elements found yet.";
-
-                                let everFoundTodayTimestamp = false;
-                                let everFoundOutgoingToday = false;
-                                let currentSectionIsToday = false;
-                                let oldestTimestamp = null;
-
-                                for (const el of allElements) {
-                                    const className = el.className || '';
-                                    
-                                    if (className.includes('DivTimeContainer')) {
-                                        const timeText = (el.innerText || '').trim();
-                                        if (!oldestTimestamp) oldestTimestamp = timeText;
-                                        const isTime = /^\\d{1,2}[:.]\\d{2}(?:\\s?[AaPp][Mm])?$/.test(timeText);
-                                        const hasToday = timeText.toLowerCase().includes('today') || timeText.includes(today_str);
-                                        currentSectionIsToday = isTime || hasToday;
-                                        if (currentSectionIsToday) everFoundTodayTimestamp = true;
-                                    } 
-                                    else if (className.includes('DivChatItemWrapper') && currentSectionIsToday) {
-                                        let isOutgoing = false;
-                                        
-                                        const horizontalContainers = el.querySelectorAll('[class*="DivMessageHorizontalContainer"]');
-                                        for (let i = 0; i < horizontalContainers.length; i++) {
-                                            const hcStyle = window.getComputedStyle(horizontalContainers[i]);
-                                            if (hcStyle.flexDirection === 'row-reverse' || hcStyle.justifyContent === 'flex-end') {
-                                                isOutgoing = true;
-                                            }
-                                        }
-
-                                        const avatars = el.querySelectorAll('[data-e2e="chat-avatar"]');
-                                        for (let i = 0; i < avatars.length; i++) {
-                                            if (avatars[i].getBoundingClientRect().left > window.innerWidth / 2) {
-                                                isOutgoing = true;
-                                            }
-                                        }
-
-                                        const textBubble = el.querySelector('[data-e2e="dm-new-message-text"]');
-                                        if (textBubble && textBubble.getBoundingClientRect().left > window.innerWidth / 2) {
-                                            isOutgoing = true;
-                                        }
-
-                                        const style = window.getComputedStyle(el);
-                                        if (style.justifyContent === 'flex-end' || style.textAlign === 'right' || style.float === 'right') {
-                                            isOutgoing = true;
-                                        }
-
-                                        if (isOutgoing) {
-                                            everFoundOutgoingToday = true;
-                                        }
-                                    }
-                                }
-
-                                if (everFoundOutgoingToday) {
-                                    return "SKIP: Found outgoing message under a today timestamp.";
-                                }
-                                
-                                // Check if the oldest visible timestamp is NOT from today — means we've scrolled past all today's messages
-                                if (oldestTimestamp) {
-                                    const isOldTime = /^\\d{1,2}[:.]\\d{2}/.test(oldestTimestamp) === false && 
-                                                      !oldestTimestamp.toLowerCase().includes('today') && 
-                                                      !oldestTimestamp.includes(today_str);
-                                    if (isOldTime && everFoundTodayTimestamp) {
-                                        return "SEND: Scrolled through all today's messages, no outgoing found.";
-                                    }
-                                }
-                                
-                                if (everFoundTodayTimestamp) {
-                                    return "CONTINUE: Today's messages visible but no outgoing yet, scroll more.";
-                                }
-                                
-                                return "SEND: No today timestamps found.";
-                            }"""
-                            
-                            # First check at current scroll position (bottom of chat)
-                            result_str = page.evaluate(js_check, today_str)
-                            logger.info(f"Scroll check 0: {result_str}")
-                            
-                            if result_str.startswith("CONTINUE"):
-                                # Scroll up incrementally to find our outgoing message
-                                # Use mouse wheel to scroll up - much more reliable than guessing container class names
-                                # Position mouse over the chat area (center of page, slightly above the input)
-                                input_box = input_element.bounding_box()
-                                if input_box:
-                                    scroll_x = input_box['x'] + input_box['width'] / 2
-                                    scroll_y = input_box['y'] - 200  # Above the input, in the message area
-                                else:
-                                    scroll_x = 600
-                                    scroll_y = 400
-                                
-                                for scroll_i in range(30):  # Keep scrolling until we hit non-today
-                                    page.mouse.wheel(delta_x=0, delta_y=-500)  # Scroll UP
-                                    time.sleep(0.8)
-                                    
-                                    result_str = page.evaluate(js_check, today_str)
-                                    logger.info(f"Scroll check {scroll_i + 1}: {result_str}")
-                                    
-                                    if not result_str.startswith("CONTINUE"):
-                                        break
-                            
-                            logger.info(f"History Check Result: {result_str}")
-                            already_sent_today = result_str.startswith("SKIP")
-                            
-                        except Exception as e:
-                            logger.warning(f"Failed to check chat history (fail-open): {str(e)}")
-                            
-                        if already_sent_today:
-                            logger.info(f"Skipped {friend} - already sent today")
-                            success_count += 1
-                            break
-
-                        # --- SEND MESSAGE ---
-                        if found_input and input_element:
-                            try:
-                                input_element.focus()
-                                input_element.click()
-                                time.sleep(2)
-                                page.keyboard.type("โฟปริ้นลืมเติมไฟอีกแล้วจ้า ระบบสำรองไฟทำงาน😎", delay=200)
-                                time.sleep(2)
-                                page.keyboard.press("Enter")
-                                time.sleep(1)
-                                page.keyboard.press("Enter") # Double tap
-                                
-                                logger.info(f"Successfully sent message to {friend}")
-                                success_count += 1
-                                break
-                            except Exception as e:
-                                logger.warning(f"Failed to type in input field: {str(e)}")
-                                found_input = False # Fallback to blind typing
-                        
-                        if not found_input:
-                            # Blind typing attempt
-                            logger.info("Input field not found. Trying Blind Typing...")
-                            for _ in range(3): page.keyboard.press("Tab")
-                            time.sleep(1)
-                            page.keyboard.type("โฟปริ้นลืมเติมไฟอีกแล้วจ้า ระบบสำรองไฟทำงาน😎", delay=200)
-                            page.keyboard.press("Enter")
-                            time.sleep(1)
-                            page.keyboard.press("Enter")
-                            page.screenshot(path=f"blind_attempt_{safe_name}.png")
-                            logger.info(f"Successfully sent message to {friend} (Blind Typing)")
-                            found_input = True # Assume success for logging
-                            success_count += 1
-                            break
-                    except Exception as e:
-                        if attempt == 2: raise e
-                        logger.warning(f"Attempt {attempt+1} failed: {str(e)}")
-                        page.reload()
-                        time.sleep(5)
-                    except Exception as e:
-                        if attempt == 2: raise e
-                        logger.warning(f"Attempt {attempt+1} failed: {str(e)}")
-                        page.reload()
-                        time.sleep(5)
-
-                # Longer randomized delay between different friends (15-30 seconds)
-                # This is crucial for "All-In" with 42 friends
-                wait_time = random.uniform(15, 30)
-                logger.info(f"Waiting {wait_time:.2f} seconds before next friend...")
-                time.sleep(wait_time)
-
-            except PlaywrightTimeoutError:
-                logger.error(f"Timeout while processing {friend}. The UI might have changed or the user was not found.")
-                failed_friends.append(friend)
-            except Exception as e:
-                logger.error(f"An error occurred for {friend}: {str(e)}")
-                failed_friends.append(friend)
-
-        browser.close()
-        
-        # Final Report
-        logger.info(f"--- Automation Complete ---")
-        logger.info(f"Total Friends: {len(friends)}")
-        logger.info(f"Successful: {success_count}")
-        logger.info(f"Failed: {len(failed_friends)}")
-        if failed_friends:
-            logger.info(f"Failed friends: {', '.join(failed_friends)}")
+    # Final Report
+    for name, report in reports.items():
+        if name:
+            logger.info(f"--- Account {name} ---")
+        log_totals(report["total"], report['success'], report['failed'])
+        saved = report['legacy_wait'] - report['actual_wait']
+        logger.info(
+            f"Waiting: {report['actual_wait']:.1f}s on readiness signals and jitter "
+            f"instead of {report['legacy_wait']:.1f}s of fixed sleeps (saved {saved:.1f}s)"
+        )
+        blocked_types = ", ".join(f"{t}={n}" for t, n in sorted(report['blocked_by_type'].items()))
+        logger.info(
+            f"Network: blocked {report['blocked_requests']} requests ({blocked_types or 'none'}) "
+            f"saving at least {report['blocked_bytes'] / 1024 / 1024:.1f} MB, "
+            f"allowed {report['allowed_requests']} responses totalling "
+            f"{report['downloaded_bytes'] / 1024 / 1024:.1f} MB"
+        )
+    for phase, stats in timing_summary["phases"].items():
+        logger.info(f"Timing {phase}: n={stats['count']} p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s total={stats['total']:.1f}s")
+    for line in selectors.hit_rates():
+        logger.info(f"Selector hit rate {line}")
+    if timing_summary["slowest_friends"]:
+        slowest = ", ".join(f"{item['friend']} ({item['seconds']:.1f}s)" for item in timing_summary["slowest_friends"])
+        logger.info(f"Slowest friends: {slowest}")
+    logger.info(
+        f"Screenshots ({CAPTURE_MODE}): wrote {capture_counts['written']} ({round(capture_bytes / 1024)} KB)"
+        + (f", skipped {capture_counts['dropped']} over the {CAPTURE_RUN_MB:g} MB run limit" if capture_counts['dropped'] else "")
+    )
+
+    # With a single account this is just its report; with several, the totals plus each one's report
+    if list(reports) == [None]:
+        return reports[None]
+    return {
+        "success": sum(r["success"] for r in reports.values()),
+        "failed": [f"{name}: {friend}" for name, r in reports.items() for friend in r["failed"]],
+        "friend_seconds": {f"{name}/{friend}": s for name, r in reports.items() for friend, s in r["friend_seconds"].items()},
+        "logged_out": any(r["logged_out"] for r in reports.values()),
+        "accounts": reports
+    }
 
 if __name__ == "__main__":
-    run_automation()
+    parser = argparse.ArgumentParser(description="Keep TikTok streaks alive")
+    parser.add_argument("--shard-index", type=int, default=SHARD_INDEX, help="which shard of the friend list to run (0-based)")
+    parser.add_argument("--shard-count", type=int, default=SHARD_COUNT, help="how many shards the friend list is split into")
+    parser.add_argument("--merge", nargs="+", metavar="RESULT_FILE", help="merge shard result files into one report instead of running")
+    args = parser.parse_args()
+
+    if args.merge:
+        raise SystemExit(0 if merge_results(args.merge) else 1)
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+    report = asyncio.run(run_automation(args.shard_index, args.shard_count))
+    if report and report.get("logged_out"):
+        raise SystemExit(EXIT_SESSION_DEAD)
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# main.py opens streak_bot.log in the working directory as soon as it is imported,
+# so import it once from a scratch directory instead of the repository
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="streak_tests_"))
+import main  # noqa: E402,F401
+os.chdir(_cwd)
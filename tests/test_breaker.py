@@ -0,0 +1,14 @@
+import random
+
+import main
+
+
+def test_circuit_breaker_backoff(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    breaker = main.CircuitBreaker()
+    delays = [breaker.record_block() for _ in range(main.MAX_CONSECUTIVE_BLOCKS)]
+    assert delays == sorted(delays)
+    assert all(delay <= main.BACKOFF_MAX for delay in delays)
+    assert breaker.gave_up
+    breaker.record_success()
+    assert not breaker.gave_up
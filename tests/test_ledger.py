@@ -0,0 +1,36 @@
+import json
+
+import main
+
+
+def test_append_then_load(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    main.append_ledger("@Alice", "sent", path)
+    main.append_ledger("bob", "failed", path)
+    main.append_ledger("https://www.tiktok.com/@Carol?lang=en", "already_sent", path)
+
+    today = json.loads(open(path).readline())["date"]
+    assert main.load_ledger(today, path) == {"alice": "sent", "carol": "already_sent"}
+
+
+def test_other_days_are_ignored(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    path.write_text(json.dumps({"date": "2000-01-01", "friend": "alice", "outcome": "sent"}) + "\n")
+    assert main.load_ledger("2000-01-02", str(path)) == {}
+
+
+def test_missing_ledger(tmp_path):
+    assert main.load_ledger("2000-01-01", str(tmp_path / "nope.jsonl")) == {}
+
+
+def test_torn_last_line(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    good = json.dumps({"date": "2000-01-01", "friend": "alice", "outcome": "sent"})
+    path.write_text(good + "\n" + '{"date": "2000-01-01", "friend": "bo')
+
+    assert main.load_ledger("2000-01-01", str(path)) == {"alice": "sent"}
+    # The torn line is terminated so the next entry lands on its own line
+    main.append_ledger("carol", "sent", str(path))
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[-1])["friend"] == "carol"
+    assert lines[1] == '{"date": "2000-01-01", "friend": "bo'
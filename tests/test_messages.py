@@ -0,0 +1,15 @@
+import main
+
+
+def test_probe_uses_longest_text_between_emoji():
+    assert main.message_probe("🔥 streak 🔥 day 5") == "streak"
+    assert main.message_probe("hi ❤️ there friend") == "there friend"
+
+
+def test_probe_is_capped():
+    assert main.message_probe("a" * 40) == "a" * 20
+
+
+def test_probe_for_emoji_only_message_is_empty():
+    assert main.message_probe("🔥") == ""
+    assert main.message_probe("🔥 ❤️") == ""
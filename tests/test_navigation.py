@@ -0,0 +1,37 @@
+import asyncio
+
+import main
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeCaptures:
+    def snap(self, page, friend, label):
+        pass
+
+
+class FakePage:
+    def __init__(self, status=200, title="Messages | TikTok", url="https://www.tiktok.com/messages"):
+        self.status = status
+        self._title = title
+        self.url = url
+
+    async def goto(self, url, **options):
+        return FakeResponse(self.status)
+
+    async def title(self):
+        return self._title
+
+
+def open_chat(page):
+    return asyncio.run(main.open_chat(page, "alice", "https://www.tiktok.com/messages?u=1", main.logger, FakeCaptures()))
+
+
+def test_open_chat_detects_blocks_and_logouts():
+    assert open_chat(FakePage()) is None
+    assert open_chat(FakePage(status=429)) == "blocked"
+    assert open_chat(FakePage(title="Security Check - Verify")) == "blocked"
+    assert open_chat(FakePage(url="https://www.tiktok.com/login?redirect_url=x")) == "logged_out"
@@ -0,0 +1,62 @@
+import asyncio
+
+import main
+
+
+class FakeCDPSession:
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def send(self, method, params=None):
+        self.sent.append((method, params))
+
+
+class FakeContext:
+    def __init__(self):
+        self.cdp = FakeCDPSession()
+
+    async def new_page(self):
+        return object()
+
+    async def new_cdp_session(self, page):
+        return self.cdp
+
+
+def paused(request_id, resource_type, url, length=None):
+    event = {"requestId": request_id, "resourceType": resource_type, "request": {"url": url}}
+    if length is not None:
+        event["responseStatusCode"] = 200
+        event["responseHeaders"] = [{"name": "Content-Length", "value": str(length)}]
+    return event
+
+
+def test_open_page_blocks_through_devtools(monkeypatch):
+    monkeypatch.setattr(main, "BLOCK_RESOURCE_TYPES", {"image", "xhr"})
+    monkeypatch.setattr(main, "BLOCK_URL_PATTERNS", ["mon.tiktokv.com"])
+    monkeypatch.setattr(main, "ALLOW_URL_PATTERNS", ["/keep/"])
+    report = {"blocked_requests": 0, "blocked_bytes": 0, "blocked_by_type": {}}
+    context = FakeContext()
+
+    async def go():
+        await main.open_page(context, report)
+        handler = context.cdp.handlers["Fetch.requestPaused"]
+        handler(paused("1", "Image", "https://cdn/avatar.jpeg", 2048))
+        handler(paused("2", "Ping", "https://mon.tiktokv.com/beacon"))
+        handler(paused("3", "Image", "https://cdn/keep/logo.png", 10))
+        await asyncio.sleep(0)
+
+    asyncio.run(go())
+    method, params = context.cdp.sent[0]
+    assert method == "Fetch.enable"
+    assert {"urlPattern": "*mon.tiktokv.com*", "requestStage": "Request"} in params["patterns"]
+    assert {"urlPattern": "*", "resourceType": "XHR", "requestStage": "Response"} in params["patterns"]
+    assert ("Fetch.continueRequest", {"requestId": "3"}) in context.cdp.sent
+    failed = [p["requestId"] for m, p in context.cdp.sent if m == "Fetch.failRequest"]
+    assert sorted(failed) == ["1", "2"]
+    assert report["blocked_requests"] == 2
+    assert report["blocked_bytes"] == 2048
+    assert report["blocked_by_type"] == {"image": 1, "ping": 1}
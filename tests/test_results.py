@@ -0,0 +1,67 @@
+import json
+
+import main
+
+
+def write_shards(shards, count, account=None, logged_out=()):
+    for index, failed in shards.items():
+        report = {"success": 2 - len(failed), "failed": failed}
+        main.write_result(index, count, 2, report, index in logged_out, account)
+
+
+def merged():
+    with open("streak_result_merged.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_merge_complete(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_shards({0: [], 1: ["bob"]}, 2)
+
+    assert main.merge_results([main.result_path(0, 2), main.result_path(1, 2)])
+    result = merged()
+    assert (result["total"], result["success"], result["failed"]) == (4, 3, ["bob"])
+    assert result["complete"]
+
+
+def test_merge_missing_shard(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_shards({0: [], 2: []}, 3)
+
+    assert not main.merge_results([main.result_path(0, 3), main.result_path(2, 3), "streak_result_gone.json"])
+    assert not merged()["complete"]
+
+
+def test_merge_logged_out_shard(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_shards({0: [], 1: []}, 2, logged_out=(1,))
+    assert not main.merge_results([main.result_path(0, 2), main.result_path(1, 2)])
+
+
+def test_merge_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert not main.merge_results([])
+
+
+def test_in_shard_is_stable_and_partitions():
+    friends = [f"friend{i}" for i in range(50)]
+    for friend in friends:
+        owners = [i for i in range(3) if main.in_shard(friend, i, 3)]
+        assert len(owners) == 1
+    # Spelling of the same username doesn't move it to another shard
+    assert main.in_shard("@Friend7", 1, 3) == main.in_shard("friend7", 1, 3)
+    assert main.in_shard("https://www.tiktok.com/@friend7", 1, 3) == main.in_shard("friend7", 1, 3)
+
+
+
+def test_merge_accounts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_shards({0: ["a"], 1: []}, 2, "main")
+    write_shards({0: []}, 2, "alt")
+
+    paths = [main.result_path(i, 2, "main") for i in (0, 1)] + [main.result_path(0, 2, "alt")]
+    assert not main.merge_results(paths)
+    result = merged()
+    assert result["failed"] == ["main: a"]
+    assert result["accounts"]["main"]["total"] == 4
+    assert result["accounts"]["alt"]["total"] == 2
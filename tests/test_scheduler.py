@@ -0,0 +1,102 @@
+import time
+import asyncio
+
+import pytest
+
+import main
+
+
+class FakePage:
+    async def close(self):
+        pass
+
+
+class FakeCDPSession:
+    def on(self, event, handler):
+        pass
+
+    async def send(self, method, params=None):
+        pass
+
+
+class FakeContext:
+    async def new_page(self):
+        return FakePage()
+
+    async def new_cdp_session(self, page):
+        return FakeCDPSession()
+
+    async def storage_state(self, path):
+        pass
+
+    async def close(self):
+        pass
+
+
+def run_account(tmp_path, monkeypatch, outcome_for, friends=20, backoff=0.01):
+    async def open_session(*args):
+        return FakeContext()
+
+    async def install_resource_filter(*args):
+        pass
+
+    async def process_friend(page, friend, *args):
+        outcome = outcome_for(friend)
+        # Blocks take a little longer, so the other workers are already waiting for a friend
+        await asyncio.sleep(0.05 if outcome == "blocked" else 0.01)
+        return outcome
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "open_session", open_session)
+    monkeypatch.setattr(main, "install_resource_filter", install_resource_filter)
+    monkeypatch.setattr(main, "process_friend", process_friend)
+    monkeypatch.setattr(main, "INBOX_PLANNING", False)
+    monkeypatch.setattr(main, "CONCURRENCY", 3)
+    monkeypatch.setattr(main, "FRIEND_DELAY", [0, 0])
+    monkeypatch.setattr(main, "BACKOFF_BASE", backoff)
+    monkeypatch.setattr(main, "BACKOFF_MAX", backoff * 5)
+
+    account = main.make_account(None, [], [f"friend{i}" for i in range(friends)], None)
+    account["ledger"] = str(tmp_path / "ledger.jsonl")
+
+    async def go():
+        timings = main.Timings(str(tmp_path / "timings.jsonl"))
+        return await asyncio.wait_for(main.run_account(
+            None, account, 0, 1, {}, timings, main.SelectorResolver(str(tmp_path / "stats.json")), main.Captures()
+        ), 30)
+
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("outcome_for, logged_out", [
+    (lambda friend: "sent", False),
+    (lambda friend: "blocked", False),
+    (lambda friend: "logged_out" if friend == "friend5" else "sent", True),
+])
+def test_every_friend_is_counted(tmp_path, monkeypatch, outcome_for, logged_out):
+    report = run_account(tmp_path, monkeypatch, outcome_for)
+    assert report["success"] + len(report["failed"]) == report["total"] == 20
+    assert len(set(report["failed"])) == len(report["failed"])
+    assert report["logged_out"] == logged_out
+
+
+def test_no_friend_starts_while_the_breaker_is_open(tmp_path, monkeypatch):
+    breakers = []
+    starts = []
+
+    class RecordingBreaker(main.CircuitBreaker):
+        def __init__(self):
+            super().__init__()
+            breakers.append(self)
+
+    def outcome_for(friend):
+        starts.append(time.monotonic() - breakers[0].open_until)
+        # The first attempt is blocked, every later one goes through
+        return "blocked" if len(starts) == 1 else "sent"
+
+    monkeypatch.setattr(main, "CircuitBreaker", RecordingBreaker)
+    monkeypatch.setattr(main, "MAX_CONSECUTIVE_BLOCKS", 5)
+    report = run_account(tmp_path, monkeypatch, outcome_for, friends=2, backoff=0.3)
+    assert report["success"] == 2
+    assert len(starts) == 3
+    assert all(offset >= 0 for offset in starts[1:])
@@ -0,0 +1,164 @@
+import asyncio
+
+import main
+
+
+class FakeResponse:
+    status = 200
+    ok = True
+
+    async def json(self):
+        return {"message": "success", "data": {"user_id": "1", "username": "bench"}}
+
+
+class FakeRequest:
+    async def get(self, url, timeout=None):
+        return FakeResponse()
+
+
+class FakeContext:
+    def __init__(self):
+        self.request = FakeRequest()
+        self.cookies = None
+
+    async def add_cookies(self, cookies):
+        self.cookies = cookies
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    async def new_context(self, **options):
+        return FakeContext()
+
+
+def test_empty_cookie_list_still_opens_a_session(tmp_path):
+    # The offline benchmark runs with TIKTOK_COOKIES="[]"
+    context = asyncio.run(main.open_session(FakeBrowser(), [], str(tmp_path / "missing.json")))
+    assert context.cookies == []
+
+
+def saved_state(tmp_path, cookies):
+    path = str(tmp_path / "storage_state.json")
+    with open(path, "w") as f:
+        f.write('{"cookies": [], "origins": []}')
+    main.write_fingerprint(path, cookies)
+    return path
+
+
+class StateBrowser(FakeBrowser):
+    async def new_context(self, **options):
+        context = FakeContext()
+        context.storage_state = options.get("storage_state")
+        return context
+
+
+def test_saved_state_wins_while_the_cookies_match(tmp_path):
+    old = [{"name": "sessionid", "value": "old"}]
+    path = saved_state(tmp_path, old)
+    context = asyncio.run(main.open_session(StateBrowser(), old, path))
+    assert context.storage_state == path
+
+
+def test_new_cookies_discard_the_saved_state(tmp_path):
+    path = saved_state(tmp_path, [{"name": "sessionid", "value": "old"}])
+    new = [{"name": "sessionid", "value": "new"}]
+    context = asyncio.run(main.open_session(StateBrowser(), new, path))
+    assert context.storage_state is None
+    assert context.cookies == new
+
+
+def test_saved_state_without_cookies_is_kept(tmp_path):
+    path = saved_state(tmp_path, [{"name": "sessionid", "value": "old"}])
+    context = asyncio.run(main.open_session(StateBrowser(), None, path))
+    assert context.storage_state == path
+
+
+class DeadResponse:
+    status = 401
+    ok = False
+
+
+class DeadRequest:
+    async def get(self, url, timeout=None):
+        return DeadResponse()
+
+
+def test_dead_session_is_reported_not_raised(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def new_context(self, **options):
+        context = FakeContext()
+        context.request = DeadRequest()
+        return context
+
+    monkeypatch.setattr(FakeBrowser, "new_context", new_context)
+    account = main.make_account("main", [], ["alice", "bob"], None)
+    report = asyncio.run(main.run_account(FakeBrowser(), account, 0, 1, {}, None, None, None))
+    assert report["logged_out"]
+    assert (report["total"], report["success"], report["failed"]) == (2, 0, [])
+
+
+def test_finished_rerun_skips_the_session_check(tmp_path, monkeypatch):
+    # Everybody is in today's ledger, so an expired session must not fail the rerun
+    monkeypatch.chdir(tmp_path)
+
+    async def new_context(self, **options):
+        raise AssertionError("no browser context should be opened")
+
+    monkeypatch.setattr(FakeBrowser, "new_context", new_context)
+    account = main.make_account("main", [], ["alice", "bob"], None)
+    main.append_ledger("alice", "sent", account["ledger"])
+    main.append_ledger("bob", "already_sent", account["ledger"])
+    report = asyncio.run(main.run_account(FakeBrowser(), account, 0, 1, {}, None, None, None))
+    assert not report["logged_out"]
+    assert (report["total"], report["success"], report["failed"]) == (2, 2, [])
+
+
+class FakePlaywright:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    @property
+    def chromium(self):
+        return self
+
+    async def launch(self, **options):
+        return self.browser
+
+
+def test_dead_account_does_not_break_the_others(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    class MixedBrowser(FakeBrowser):
+        # The first context is the dead "main" account, the second the live "alt" one
+        contexts = 0
+
+        async def new_context(self, **options):
+            context = FakeContext()
+            MixedBrowser.contexts += 1
+            if MixedBrowser.contexts == 1:
+                context.request = DeadRequest()
+            return context
+
+        async def close(self):
+            pass
+
+    async def install_resource_filter(*args):
+        pass
+
+    playwright = FakePlaywright()
+    playwright.browser = MixedBrowser()
+    monkeypatch.setattr(main, "async_playwright", lambda: playwright)
+    monkeypatch.setattr(main, "install_resource_filter", install_resource_filter)
+    monkeypatch.setattr(main, "INBOX_PLANNING", False)
+    monkeypatch.setenv("ACCOUNTS", '[{"name": "main", "cookies": [], "friends": "alice"}, {"name": "alt", "cookies": []}]')
+
+    report = asyncio.run(main.run_automation())
+    assert report["logged_out"]
+    assert report["accounts"]["main"]["logged_out"]
+    assert not report["accounts"]["alt"]["logged_out"]
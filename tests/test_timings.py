@@ -0,0 +1,7 @@
+import main
+
+
+def test_percentile():
+    assert main.percentile([], 50) == 0.0
+    assert main.percentile([3, 1, 2], 50) == 2
+    assert main.percentile(list(range(1, 101)), 95) == 95
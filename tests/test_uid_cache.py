@@ -0,0 +1,74 @@
+import asyncio
+
+import main
+
+
+class FakeResponse:
+    status = 200
+
+
+class FakePage:
+    url = "https://www.tiktok.com/messages?u=1"
+
+    async def goto(self, url, **options):
+        return FakeResponse()
+
+    async def title(self):
+        return "Messages | TikTok"
+
+    async def evaluate(self, script, arg=None):
+        return {"result": "SEND: No today timestamps found.", "steps": 0, "stepMs": [], "loadMs": 0}
+
+
+class FakeSelectors:
+    def __init__(self, found):
+        self.found = found
+
+    async def race(self, page, kind, selectors, timeout=None):
+        return ("input", object()) if self.found else (None, None)
+
+
+class FakeCaptures:
+    def snap(self, page, friend, label):
+        pass
+
+
+class NoJitter:
+    def __init__(self, report):
+        pass
+
+    async def pause(self, share=0.3):
+        pass
+
+
+def process_friend(tmp_path, monkeypatch, found_input, send_error=None):
+    async def send_message(*args):
+        raise send_error
+
+    async def open_profile(*args):
+        return "failed"
+
+    monkeypatch.setattr(main, "JitterBudget", NoJitter)
+    monkeypatch.setattr(main, "send_message", send_message)
+    monkeypatch.setattr(main, "open_profile", open_profile)
+    uid_cache = {"alice": "1"}
+    report = {"legacy_wait": 0.0, "actual_wait": 0.0}
+    timings = main.Timings(str(tmp_path / "timings.jsonl"))
+    account = main.make_account(None, [], ["alice"], None)
+    outcome = asyncio.run(main.process_friend(
+        FakePage(), "alice", main.logger, account, uid_cache, report, timings,
+        FakeSelectors(found_input), FakeCaptures()
+    ))
+    return outcome, uid_cache
+
+
+def test_send_errors_keep_the_cached_uid(tmp_path, monkeypatch):
+    outcome, uid_cache = process_friend(tmp_path, monkeypatch, True, main.SendNotConfirmedError("no bubble"))
+    assert outcome == "failed"
+    assert uid_cache == {"alice": "1"}
+
+
+def test_chat_that_does_not_open_drops_the_cached_uid(tmp_path, monkeypatch):
+    outcome, uid_cache = process_friend(tmp_path, monkeypatch, False)
+    assert outcome == "failed"
+    assert uid_cache == {}